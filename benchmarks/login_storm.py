@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+import aiohttp
+
+
+async def login_worker(session: aiohttp.ClientSession, url: str, username: str, password: str, deadline: float,
+                       results: dict) -> None:
+    while time.monotonic() < deadline:
+        data = {'username': username, 'password': password}
+        async with session.post(f'{url}/auth/jwt/login', data=data) as response:
+            await response.read()
+            results['ok' if response.status < 300 else 'failed'] += 1
+
+
+async def probe_worker(session: aiohttp.ClientSession, url: str, path: str, deadline: float,
+                       latencies: list[float]) -> None:
+    while time.monotonic() < deadline:
+        started_time = time.perf_counter()
+        async with session.get(f'{url}{path}') as response:
+            await response.read()
+        latencies.append(time.perf_counter() - started_time)
+        await asyncio.sleep(0.05)
+
+
+def percentile(values: list[float], percent: float) -> float:
+    if not values:
+        return 0.
+    return sorted(values)[min(int(len(values) * percent / 100), len(values) - 1)]
+
+
+async def run(args) -> None:
+    results = {'ok': 0, 'failed': 0}
+    latencies = []
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency + 1, ssl=False)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        deadline = time.monotonic() + args.duration
+        started_time = time.monotonic()
+
+        await asyncio.gather(
+            probe_worker(session, args.url, args.probe, deadline, latencies),
+            *(login_worker(session, args.url, args.username, args.password, deadline, results)
+              for _ in range(args.concurrency))
+        )
+
+        duration = time.monotonic() - started_time
+
+    print(f'logins: {results["ok"]} ok, {results["failed"]} failed, {results["ok"] / duration:.1f}/s')
+    print(f'{args.probe} during the storm: {len(latencies)} requests, '
+          f'p50 {statistics.median(latencies or [0]) * 1000:.1f} ms, '
+          f'p99 {percentile(latencies, 99) * 1000:.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Login storm against /auth/jwt/login with a latency probe')
+    parser.add_argument('--url', default='http://localhost:443')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--probe', default='/news/from_vk')
+
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
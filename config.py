@@ -30,11 +30,34 @@ class Settings(BaseSettings):
     VERSION: str = Field(default='error')
     DEBUG: bool = Field(default=True)
     VK_PROCESS_DEBUG: bool = Field(default=True)
+    VK_ASYNC_MODE: bool = Field(default=False)
+    VK_FEED_SIZE: int = Field(default=100)
+    VK_WALL_PAGE_SIZE: int = Field(default=20)
+    VK_SNAPSHOT_PATH: str = Field(default='files/vk_snapshot.json')
+    VK_SHARED_MEMORY_NAME: str = Field(default='los_vk_feed')
+    VK_SHARED_MEMORY_SIZE: int = Field(default=1)
+    VK_SYNC_INTERVAL: float = Field(default=1)
+    VK_STREAM_HISTORY: int = Field(default=100)
+    VK_STREAM_QUEUE_SIZE: int = Field(default=16)
+    VK_STREAM_KEEPALIVE: float = Field(default=15)
+    VK_HTTP_POOL_SIZE: int = Field(default=4)
+    VK_HTTP_TIMEOUT: int = Field(default=10)
+    VK_ERROR_DELAY: int = Field(default=1)
 
     SECRET: str = Field(default='SECRET')
+    USER_CACHE_SIZE: int = Field(default=1024)
+    USER_CACHE_TTL: float = Field(default=30)
+    PASSWORD_HASH_WORKERS: int = Field(default=4)
+
+    JOB_WORKERS: int = Field(default=2)
+    JOB_POLL_INTERVAL: float = Field(default=5)
+    JOB_LEASE: int = Field(default=300)
+    JOB_RETRY_DELAY: int = Field(default=30)
+    JOB_MAX_ATTEMPTS: int = Field(default=5)
 
     SERVER_HOST: str = Field(default='localhost')
     SERVER_PORT: int = Field(default=443)
+    WORKERS: int = Field(default=1)
 
     POSTGRES_DB: str = Field(default='database')
     POSTGRES_USER: str = Field(default='root')
@@ -48,12 +71,36 @@ class Settings(BaseSettings):
     CURRENT_FILE_PATH: str = Field(default='')
     CURRENT_FILE_NAME: int = Field(default=0)
 
+    CODE_PAGE_SIZE: int = Field(default=50)
+    CODE_PAGE_MAX_SIZE: int = Field(default=200)
+
+    CODE_CACHE_SIZE: int = Field(default=2048)
+    CODE_CACHE_TTL: int = Field(default=300)
+    CODE_FILE_CACHE_SIZE: int = Field(default=4096)
+    CODE_FILE_CACHE_TTL: int = Field(default=300)
+    BASE64_CACHE_SIZE: int = Field(default=32)
+    BASE64_CACHE_ITEM_SIZE: int = Field(default=1)
+
+    IMAGE_WORKERS: int = Field(default=2)
+    IMAGE_MAX_VARIANT_SIZE: int = Field(default=2048)
+    IMAGE_VARIANT_STEP: int = Field(default=64)
+
     SSL_DATA: dict = Field(default={
         'ssl_keyfile': getenv('SSL_KEYFILE'),
         'ssl_certfile': getenv('SSL_CERTFILE')
     })
 
     SQLALCHEMY_URL: Optional[PostgresDsn] = None
+    SQLALCHEMY_REPLICA_URLS: list[PostgresDsn] = Field(default=[])
+    DB_REPLICA_RETRY_INTERVAL: float = Field(default=30)
+
+    DB_POOL_SIZE: int = Field(default=5)
+    DB_MAX_OVERFLOW: int = Field(default=10)
+    DB_POOL_TIMEOUT: float = Field(default=30)
+    DB_POOL_RECYCLE: int = Field(default=1800)
+    DB_POOL_PRE_PING: bool = Field(default=False)
+    DB_CONNECT_TIMEOUT: float = Field(default=5)
+    DB_STATEMENT_CACHE_SIZE: int = Field(default=100)
 
     CODE_IMAGE_CONTROLLER: FileController = Field(default=FileController('files/code'))
 
@@ -0,0 +1,62 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Callable, Hashable
+
+
+class LRUCache:
+    def __init__(self, max_size: int, get_size: Callable[[Any], int] = lambda value: 1, ttl: float | None = None):
+        self.max_size = max_size
+        self.get_size = get_size
+        self.ttl = ttl
+
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.data: OrderedDict[Hashable, Any] = OrderedDict()
+        self.expires: dict[Hashable, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if key in self.data and self.ttl is not None and self.expires[key] < monotonic():
+            self.pop(key)
+
+        if key not in self.data:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self.data.move_to_end(key)
+        return self.data[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self.pop(key)
+
+        self.data[key] = value
+        self.size += self.get_size(value)
+        if self.ttl is not None:
+            self.expires[key] = monotonic() + self.ttl
+
+        while self.size > self.max_size:
+            self.pop(next(iter(self.data)))
+
+    def pop(self, key: Hashable) -> None:
+        if key in self.data:
+            self.size -= self.get_size(self.data.pop(key))
+            self.expires.pop(key, None)
+
+    def clear(self) -> None:
+        self.data.clear()
+        self.expires.clear()
+        self.size = 0
+
+    def stats(self) -> dict:
+        return {
+            'items': len(self.data),
+            'size': self.size,
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
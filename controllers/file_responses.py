@@ -0,0 +1,145 @@
+import base64
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import AsyncIterator, BinaryIO, Mapping
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, FileResponse, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+# a multiple of 3, so every chunk encodes without padding
+BASE64_CHUNK_SIZE = 3 * 64 * 1024
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def make_etag(*parts: str | int) -> str:
+    return '"' + '-'.join(str(part) for part in parts) + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == '*':
+        return True
+
+    return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+
+
+def accepts_encoding(headers: Mapping[str, str], encoding: str) -> bool:
+    # an explicit entry wins over '*', q=0 refuses the coding
+    qualities = {}
+    for item in headers.get('accept-encoding', '').lower().split(','):
+        coding, *parameters = item.split(';')
+        quality = 1.
+        for parameter in parameters:
+            name, _, value = parameter.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.
+        if coding.strip():
+            qualities[coding.strip()] = quality
+
+    return qualities.get(encoding, qualities.get('*', 0.)) > 0
+
+
+def is_not_modified(headers: Mapping[str, str], etag: str, modified_time: float | None = None) -> bool:
+    if (if_none_match := headers.get('if-none-match')) is not None:
+        return etag_matches(if_none_match, etag)
+
+    if modified_time is not None and (if_modified_since := headers.get('if-modified-since')) is not None:
+        try:
+            return int(modified_time) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    return False
+
+
+def parse_range(headers: Mapping[str, str], size: int, etag: str) -> tuple[int, int] | None:
+    if (byte_range := headers.get('range')) is None or not byte_range.startswith('bytes='):
+        return None
+
+    if (if_range := headers.get('if-range')) is not None and if_range.strip() != etag:
+        return None
+
+    ranges = byte_range.removeprefix('bytes=').split(',')
+    if len(ranges) != 1:
+        # multipart ranges are not worth it for images, send the whole file
+        return None
+
+    start, _, end = ranges[0].strip().partition('-')
+    try:
+        if not start:
+            start, end = max(size - int(end), 0), size - 1
+        else:
+            start, end = int(start), min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+
+    if start > end or start >= size:
+        raise HTTPException(416, headers={'content-range': f'bytes */{size}'})
+
+    return start, end
+
+
+async def read_file_range(file_path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    file = await run_in_threadpool(open, file_path, 'rb')
+    try:
+        await run_in_threadpool(file.seek, start)
+
+        remaining = end - start + 1
+        while remaining > 0 and (content := await run_in_threadpool(file.read, min(CHUNK_SIZE, remaining))):
+            remaining -= len(content)
+            yield content
+    finally:
+        await run_in_threadpool(file.close)
+
+
+def get_base64_json_size(size: int) -> int:
+    return -(-size // 3) * 4 + 2
+
+
+def _read_base64(file: BinaryIO) -> bytes:
+    return base64.b64encode(file.read(BASE64_CHUNK_SIZE))
+
+
+async def read_file_base64_json(file_path: str) -> AsyncIterator[bytes]:
+    file = await run_in_threadpool(open, file_path, 'rb')
+    try:
+        yield b'"'
+        while content := await run_in_threadpool(_read_base64, file):
+            yield content
+        yield b'"'
+    finally:
+        await run_in_threadpool(file.close)
+
+
+async def file_response(headers: Mapping[str, str], file_path: str, media_type: str,
+                        etag: str | None = None, cache_control: str = IMMUTABLE_CACHE_CONTROL) -> Response:
+    try:
+        stat_result = await run_in_threadpool(os.stat, file_path)
+    except FileNotFoundError:
+        raise HTTPException(404, detail=f'server founded file in db but miss {file_path}')
+
+    etag = etag or make_etag(f'{stat_result.st_mtime_ns:x}', f'{stat_result.st_size:x}')
+    response_headers = {
+        'etag': etag,
+        'last-modified': formatdate(stat_result.st_mtime, usegmt=True),
+        'cache-control': cache_control,
+        'accept-ranges': 'bytes',
+    }
+
+    if is_not_modified(headers, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=response_headers)
+
+    if (byte_range := parse_range(headers, stat_result.st_size, etag)) is None:
+        return FileResponse(file_path, media_type=media_type, headers=response_headers, stat_result=stat_result)
+
+    start, end = byte_range
+    response_headers.update({
+        'content-range': f'bytes {start}-{end}/{stat_result.st_size}',
+        'content-length': str(end - start + 1),
+    })
+    return StreamingResponse(read_file_range(file_path, start, end), status_code=206,
+                             media_type=media_type, headers=response_headers)
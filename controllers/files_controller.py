@@ -1,8 +1,34 @@
 import os
 from string import ascii_letters
 
+try:
+    import fcntl
+except ImportError:
+    import msvcrt
+
+    fcntl = None
+
+
+def lock_file(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+
+def unlock_file(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
 
 class FileController:
+    FILES_PER_DIR = 999
+    COUNTER_WIDTH = 20
+
     def __init__(self, directory: str, file_const: str = ascii_letters, file_format='jpg'):
         self.create_dir(directory, pre=True)
 
@@ -14,79 +40,76 @@ class FileController:
         self.directory = directory
         self.file_format = file_format
 
-        self.current_path = self.get_last_path()
-
-        self.current_file_index = self.get_last_file_index()
-
-    def get_last_path(self) -> str:
-        current_dir = self.file_const[:2]
+        self.counter_path = f'{self.directory}/.counter'
 
-        if not os.path.isdir(f'{self.directory}/{current_dir}'):
-            os.mkdir(f'{self.directory}/{current_dir}')
+    def create_dir(self, path: str, pre=False):
+        if not pre:
+            path = f'{self.directory}/{path}'
 
-        while os.path.isdir(path := f'{self.directory}/{current_dir}')\
-                and f'999.{self.file_format}' in os.listdir(path):
-            current_dir = self.next_dir()
+        os.makedirs(path, exist_ok=True)
 
-        return current_dir
+    def get_dir_name(self, dir_index: int) -> str:
+        # dirs go "ab", "cd", ..., "YZ", "ab/ab", "ab/cd", ..., "YZ/YZ", "ab/ab/ab", ...
+        base = len(self.file_const) // 2
 
-    def get_last_file_index(self) -> int:
-        def check_format(filename: str):
-            data = filename.split('.')
+        depth = 1
+        while dir_index >= base ** depth:
+            dir_index -= base ** depth
+            depth += 1
 
-            if len(data) != 2:
-                return False
+        directories = []
+        for _ in range(depth):
+            dir_index, value = divmod(dir_index, base)
+            directories.append(self.file_const[value * 2:value * 2 + 2])
 
-            if data[-1] != self.file_format:
-                return False
+        return '/'.join(reversed(directories))
 
-            if not data[0].isdigit():
-                return False
+    def get_legacy_index(self) -> int:
+        # only used once, when there is no counter file next to already saved files
+        dir_index = 0
+        while os.path.isdir(path := f'{self.directory}/{self.get_dir_name(dir_index)}'):
+            filenames = os.listdir(path)
+            indexes = [int(filename.split('.')[0]) for filename in filenames
+                       if filename.endswith(f'.{self.file_format}') and filename.split('.')[0].isdigit()]
 
-            return True
+            if f'{self.FILES_PER_DIR}.{self.file_format}' not in filenames:
+                return dir_index * self.FILES_PER_DIR + max(indexes, default=0)
+            dir_index += 1
 
-        path = f'{self.directory}/{self.current_path}'
-        files = [item for item in os.listdir(path) if os.path.isfile(f'{path}/{item}')]
-        files = sorted(filter(check_format, files), key=lambda filename: int(filename.split('.')[0]))
-        return int(files[-1].split('.')[0]) if files else 0
+        return dir_index * self.FILES_PER_DIR
 
-    def create_dir(self, path: str, pre=False):
-        if not pre:
-            path = f'{self.directory}/{path}'
+    def allocate_index(self) -> int:
+        fd = os.open(self.counter_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            lock_file(fd)
+            try:
+                os.lseek(fd, 0, os.SEEK_SET)
+                content = os.read(fd, self.COUNTER_WIDTH).strip()
+                index = int(content) if content.isdigit() else self.get_legacy_index()
 
-        if not os.path.isdir(path):
-            os.makedirs(path)
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.write(fd, str(index + 1).rjust(self.COUNTER_WIDTH, '0').encode())
+            finally:
+                unlock_file(fd)
+        finally:
+            os.close(fd)
 
-    def next_dir(self) -> str:
-        def check_prev_dir(data):
-            for depth in range(-2, -len(data) - 1, -1):
-                if data[depth] != self.file_const[-2:]:
-                    next_value = self.file_const.find(data[depth]) + 2
-                    return data[:depth] + [self.file_const[next_value: next_value + 2]] \
-                           + [self.file_const[:2]] * (-depth - 1)
-            return [self.file_const[:2] for _ in range(len(data) + 1)]
+        return index
 
-        directories = self.current_path.split('/')
-        current_value = self.file_const.find(directories[-1])
-        if current_value == -1:
-            raise FileNotFoundError(f'current dir can\'t be "{self.current_path}"')
+    def get_filename(self) -> str:
+        dir_index, file_index = divmod(self.allocate_index(), self.FILES_PER_DIR)
 
-        if current_value != len(self.file_const) - 2:
-            directories[-1] = self.file_const[current_value + 2:current_value + 4]
-        else:
-            directories = check_prev_dir(directories)
+        path = self.get_dir_name(dir_index)
+        self.create_dir(path)
 
-        return '/'.join(directories)
+        return f'{self.directory}/{path}/{str(file_index + 1).rjust(3, "0")}.{self.file_format}'
 
-    def __get_file_path(self):
-        return f'{self.directory}/{self.current_path}/{str(self.current_file_index).rjust(3, "0")}.{self.file_format}'
+    @staticmethod
+    def get_variant_path(file_path: str, width: int | None, height: int | None, file_format: str) -> str:
+        return f'{os.path.splitext(file_path)[0]}_{width or 0}x{height or 0}.{file_format}'
 
-    def get_filename(self) -> str:
-        while os.path.isfile(self.__get_file_path()):
-            self.current_file_index = (self.current_file_index + 1) % 1000
-
-        if not self.current_file_index:
-            self.current_file_index += 1
-            self.create_dir(self.next_dir())
-        
-        return self.__get_file_path()
+    @staticmethod
+    def get_variant_paths(file_path: str) -> list[str]:
+        directory, filename = os.path.split(file_path)
+        prefix = f'{os.path.splitext(filename)[0]}_'
+        return [f'{directory}/{item}' for item in os.listdir(directory) if item.startswith(prefix)]
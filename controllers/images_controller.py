@@ -0,0 +1,82 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import suppress
+from functools import lru_cache
+
+from fastapi import HTTPException
+from PIL import Image, ImageOps
+from starlette.concurrency import run_in_threadpool
+
+from config import get_settings
+from controllers.files_controller import FileController
+
+VARIANT_FORMATS = {
+    'jpg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+}
+
+_in_progress: dict[str, asyncio.Future] = {}
+
+
+@lru_cache
+def get_image_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=get_settings().IMAGE_WORKERS)
+
+
+def get_media_type(file_format: str) -> str:
+    return VARIANT_FORMATS.get(file_format, (None, f'image/{file_format}'))[1]
+
+
+def round_variant_size(value: int | None) -> int | None:
+    if not value:
+        return None
+
+    step = get_settings().IMAGE_VARIANT_STEP
+    return min(-(-value // step) * step, get_settings().IMAGE_MAX_VARIANT_SIZE)
+
+
+def resize_image(file_path: str, variant_path: str, width: int | None, height: int | None, file_format: str) -> str:
+    with Image.open(file_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((width or image.width, height or image.height))
+
+        if file_format == 'jpg' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        temp_path = f'{variant_path}.{os.getpid()}.tmp'
+        image.save(temp_path, VARIANT_FORMATS[file_format][0], quality=85)
+
+    os.replace(temp_path, variant_path)
+    return variant_path
+
+
+async def get_image_variant(file_path: str, width: int | None, height: int | None, file_format: str) -> str:
+    width, height = round_variant_size(width), round_variant_size(height)
+    variant_path = FileController.get_variant_path(file_path, width, height, file_format)
+
+    if os.path.isfile(variant_path):
+        return variant_path
+
+    if (future := _in_progress.get(variant_path)) is None:
+        future = asyncio.get_running_loop().run_in_executor(
+            get_image_pool(), resize_image, file_path, variant_path, width, height, file_format
+        )
+        _in_progress[variant_path] = future
+        future.add_done_callback(lambda _: _in_progress.pop(variant_path, None))
+
+    try:
+        return await asyncio.shield(future)
+    except Exception as error:
+        raise HTTPException(422, detail=f'resizing image error: {error}')
+
+
+def _remove_variants(file_path: str) -> None:
+    for variant_path in FileController.get_variant_paths(file_path):
+        with suppress(FileNotFoundError):
+            os.remove(variant_path)
+
+
+async def remove_image_variants(file_path: str) -> None:
+    with suppress(FileNotFoundError):
+        await run_in_threadpool(_remove_variants, file_path)
@@ -1,24 +1,106 @@
+import hashlib
 import os
+from contextlib import suppress
+from typing import NamedTuple, BinaryIO
 
 from fastapi import UploadFile, HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
 
 from config import get_settings
+from controllers.files_controller import FileController
 
+CHUNK_SIZE = 1024 * 1024
+# room for multipart boundaries and the json part sent next to the file
+MULTIPART_OVERHEAD = 64 * 1024
 
-async def save_file(file: UploadFile, file_path: str):
-    settings = get_settings()
 
+class SavedFile(NamedTuple):
+    file_path: str
+    size: int
+    content_hash: str
+
+
+def get_max_file_size() -> int:
+    return get_settings().MAX_FILE_SIZE * 1024 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    def __init__(self, app, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            for key, value in scope['headers']:
+                if key == b'content-length' and value.isdigit() and int(value) > self.max_body_size:
+                    response = JSONResponse(
+                        status_code=413,
+                        content={'detail': f'file size more than {get_settings().MAX_FILE_SIZE} Mb'}
+                    )
+                    await response(scope, receive, send)
+                    return
+
+        await self.app(scope, receive, send)
+
+
+def _write_chunk(new_file: BinaryIO, content_hash, content: bytes) -> None:
+    new_file.write(content)
+    content_hash.update(content)
+
+
+def _discard(new_file: BinaryIO, file_path: str) -> None:
+    new_file.close()
+    with suppress(FileNotFoundError):
+        os.remove(file_path)
+
+
+async def hash_file(file: UploadFile) -> str:
+    max_file_size = get_max_file_size()
+    content_hash = hashlib.sha256()
+    size = 0
+
+    await file.seek(0)
+    while content := await file.read(CHUNK_SIZE):
+        size += len(content)
+        if size > max_file_size:
+            raise HTTPException(413, detail=f'file size more than {get_settings().MAX_FILE_SIZE} Mb')
+        await run_in_threadpool(content_hash.update, content)
+
+    await file.seek(0)
+    return content_hash.hexdigest()
+
+
+async def remove_file(file_path: str) -> None:
+    with suppress(FileNotFoundError):
+        await run_in_threadpool(os.remove, file_path)
+
+
+async def save_file(file: UploadFile, file_controller: FileController) -> SavedFile:
+    max_file_size = get_max_file_size()
+    file_path = await run_in_threadpool(file_controller.get_filename)
+    temp_path = f'{file_path}.tmp'
+
+    content_hash = hashlib.sha256()
+    size = 0
+
+    new_file = await run_in_threadpool(open, temp_path, 'wb')
     try:
-        with open(file_path, 'wb') as new_file:
-            counter = 0
-            while content := await file.read(1024 * 1024):
-                counter += 1
-                if counter > settings.MAX_FILE_SIZE:
-                    raise Exception(f'file size more than {settings.MAX_FILE_SIZE} Mb')
-                new_file.write(content)
+        while content := await file.read(CHUNK_SIZE):
+            size += len(content)
+            if size > max_file_size:
+                raise HTTPException(413, detail=f'file size more than {get_settings().MAX_FILE_SIZE} Mb')
+            await run_in_threadpool(_write_chunk, new_file, content_hash, content)
+
+        await run_in_threadpool(new_file.close)
+        await run_in_threadpool(os.replace, temp_path, file_path)
+
+    except HTTPException:
+        await run_in_threadpool(_discard, new_file, temp_path)
+        raise
 
     except Exception as error:
-        os.remove(file_path)
+        await run_in_threadpool(_discard, new_file, temp_path)
         raise HTTPException(500, detail=f'saving image error: {error}')
 
-    return file_path
+    return SavedFile(file_path=file_path, size=size, content_hash=content_hash.hexdigest())
@@ -1,20 +1,39 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
-from fastapi import Depends, Request, exceptions
+from fastapi import APIRouter, Depends, Request, exceptions
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_users import BaseUserManager, FastAPIUsers, IntegerIDMixin, schemas, models
+from fastapi_users import exceptions as user_exceptions
 from fastapi_users.authentication import (
     AuthenticationBackend,
     JWTStrategy, CookieTransport,
 )
 
 from fastapi_users.db import SQLAlchemyUserDatabase
-from sqlalchemy import select
+from sqlalchemy import select, inspect, or_, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
 from config import get_settings
+from controllers.cache_controller import LRUCache
 from db import get_async_session
-from db.models import User, get_user_db
+from db.engine import SessionManager
+from db.models import User, get_user_db, get_read_user_db
+from processes.background_jobs import get_job_queue
+
+
+# bcrypt releases the gil, a few threads keep logins off the event loop without starving it
+password_hash_executor = ThreadPoolExecutor(get_settings().PASSWORD_HASH_WORKERS, thread_name_prefix='password_hash')
+users_cache = LRUCache(get_settings().USER_CACHE_SIZE, ttl=get_settings().USER_CACHE_TTL)
+# cached for deleted users, a lagging replica can still return them for a while
+DELETED_USER = {}
+
+
+def get_user_values(user: User) -> dict:
+    return {attribute.key: getattr(user, attribute.key) for attribute in inspect(User).column_attrs}
 
 
 class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
@@ -22,6 +41,20 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
     reset_password_token_secret = __secret
     verification_token_secret = __secret
 
+    async def get(self, id: int) -> models.UP:
+        if (values := users_cache.get(id)) is DELETED_USER:
+            raise user_exceptions.UserNotExists()
+
+        if values is not None:
+            # a new instance for every request, a detached one can be attached to only one session
+            user = User(**values)
+            make_transient_to_detached(user)
+            return user
+
+        user = await super().get(id)
+        users_cache.set(id, get_user_values(user))
+        return user
+
     async def create(
             self,
             user_create: schemas.UC,
@@ -29,35 +62,92 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
             request: Optional[Request] = None,
             session: AsyncSession = Depends(get_async_session)
     ) -> models.UP:
-        statement = select(User).where(User.username == user_create.username)
-
-        if (await self.user_db.session.execute(statement)).first() is not None:
+        # the unique username index rejects duplicates, no existence query before the insert
+        try:
+            return await super().create(user_create, safe, request)
+        except IntegrityError:
+            await self.user_db.session.rollback()
             raise exceptions.HTTPException(400, detail='REGISTER_USER_ALREADY_EXISTS')
-        return await super().create(user_create, safe, request)
 
     async def on_after_register(
         self, user: models.UP, request: Optional[Request] = None
     ) -> None:
-        await self.request_verify(user)
+        await get_job_queue().enqueue(self.user_db.session, 'request_verify', {'user_id': user.id})
         await super().on_after_register(user)
 
+    async def on_after_update(
+        self, user: models.UP, update_dict: dict, request: Optional[Request] = None
+    ) -> None:
+        # the user was just written to the primary, reads from a lagging replica must not replace it
+        users_cache.set(user.id, get_user_values(user))
+        await super().on_after_update(user, update_dict, request)
+
+    async def on_after_verify(
+        self, user: models.UP, request: Optional[Request] = None
+    ) -> None:
+        users_cache.set(user.id, get_user_values(user))
+        await super().on_after_verify(user, request)
+
+    async def on_after_reset_password(
+        self, user: models.UP, request: Optional[Request] = None
+    ) -> None:
+        users_cache.set(user.id, get_user_values(user))
+        await super().on_after_reset_password(user, request)
+
+    async def on_after_delete(
+        self, user: models.UP, request: Optional[Request] = None
+    ) -> None:
+        users_cache.set(user.id, DELETED_USER)
+        await super().on_after_delete(user, request)
+
     async def authenticate(
             self, credentials: OAuth2PasswordRequestForm
     ) -> Optional[models.UP]:
-        user = await self.user_db.get_by_email(credentials.username)
+        login = credentials.username
+        statement = select(User) \
+            .where(or_(func.lower(User.email) == func.lower(login), User.username == login)) \
+            .limit(2)
+        users: list[User] = (await self.user_db.session.execute(statement)).scalars().all()
+        # an email match wins over somebody's username
+        user = next((user for user in users if user.email.lower() == login.lower()), users[0] if users else None)
+
+        loop = asyncio.get_running_loop()
         if user is None:
-            statement = select(User).where(User.username == credentials.username)
-            user = (await self.user_db.session.execute(statement)).first()
-            if user is None:
-                return None
-            credentials.username = user[0].email
-        return await super().authenticate(credentials)
+            # hash anyway, unknown logins take as long as wrong passwords
+            await loop.run_in_executor(password_hash_executor, self.password_helper.hash, credentials.password)
+            return None
+
+        verified, updated_password_hash = await loop.run_in_executor(
+            password_hash_executor, self.password_helper.verify_and_update, credentials.password, user.hashed_password
+        )
+        if not verified:
+            return None
+
+        if updated_password_hash is not None:
+            await self.user_db.update(user, {'hashed_password': updated_password_hash})
+            users_cache.set(user.id, get_user_values(user))
+        return user
+
+
+@get_job_queue().handler('request_verify')
+async def request_verify_job(payload: dict) -> None:
+    async with SessionManager().get_session() as session:
+        user_manager = UserManager(SQLAlchemyUserDatabase(session, User))
+
+        try:
+            await user_manager.request_verify(await user_manager.get(payload['user_id']))
+        except (user_exceptions.UserNotExists, user_exceptions.UserInactive, user_exceptions.UserAlreadyVerified):
+            pass
 
 
 async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db)):
     yield UserManager(user_db)
 
 
+async def get_read_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_read_user_db)):
+    yield UserManager(user_db)
+
+
 cookie_transport = CookieTransport(cookie_max_age=3600, cookie_samesite='none', cookie_httponly=False)
 
 
@@ -72,5 +162,25 @@ auth_backend = AuthenticationBackend(
 )
 
 fastapi_users = FastAPIUsers[User, int](get_user_manager, [auth_backend])
+# token checks only read the user, so they can be served by a replica
+fastapi_users_read = FastAPIUsers[User, int](get_read_user_manager, [auth_backend])
+
+current_active_user = fastapi_users_read.current_user(active=True)
+
+
+def get_users_router(user_schema: type[schemas.U], user_update_schema: type[schemas.UU]) -> APIRouter:
+    router = fastapi_users.get_users_router(user_schema, user_update_schema)
+    read_router = fastapi_users_read.get_users_router(user_schema, user_update_schema)
+    read_routes = {(route.path, frozenset(route.methods)): route for route in read_router.routes}
+
+    # the lookups are served by the read side, the route order is kept, /me has to stay before /{id}
+    routes = []
+    for route in router.routes:
+        if 'GET' in route.methods:
+            if (read_route := read_routes.get((route.path, frozenset(route.methods)))) is None:
+                raise RuntimeError(f'no read route for GET {route.path}')
+            route = read_route
+        routes.append(route)
 
-current_active_user = fastapi_users.current_user(active=True)
+    router.routes = routes
+    return router
@@ -1,8 +1,12 @@
+import asyncio
 import logging
+import time
+from typing import Iterator
 
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.exc import SQLAlchemyError, DBAPIError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from typing_extensions import AsyncGenerator
 
 from config import get_settings
@@ -11,16 +15,89 @@ import sqlalchemy as sql
 logger = logging.getLogger(__name__)
 
 
+class MeteredPool(AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = 0.
+        self.max_wait_time = 0.
+
+    def _do_get(self):
+        started_time = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait_time = time.perf_counter() - started_time
+            self.checkouts += 1
+            self.wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def get_status(self) -> dict:
+        return {
+            'size': self.size(),
+            'checked_in': self.checkedin(),
+            'checked_out': self.checkedout(),
+            'overflow': max(self.overflow(), 0),
+            'max_overflow': self._max_overflow,
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'wait_time_avg': self.wait_time / self.checkouts if self.checkouts else 0.,
+            'wait_time_max': self.max_wait_time,
+        }
+
+
+def get_engine_options(settings) -> dict:
+    return {
+        'poolclass': MeteredPool,
+        'pool_size': settings.DB_POOL_SIZE,
+        'max_overflow': settings.DB_MAX_OVERFLOW,
+        'pool_timeout': settings.DB_POOL_TIMEOUT,
+        'pool_recycle': settings.DB_POOL_RECYCLE,
+        'pool_pre_ping': settings.DB_POOL_PRE_PING,
+        'connect_args': {
+            'statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE,
+            'timeout': settings.DB_CONNECT_TIMEOUT,
+        },
+    }
+
+
+def get_read_sessionmaker(engine: AsyncEngine) -> sessionmaker:
+    # no BEGIN/COMMIT round trips and nothing to flush, reads only
+    return sessionmaker(
+        engine.execution_options(isolation_level='AUTOCOMMIT'),
+        expire_on_commit=False,
+        autoflush=False,
+        class_=AsyncSession
+    )
+
+
 class SessionManager:
 
     def __init__(self):
+        # __new__ returns the same instance, but __init__ still runs on every SessionManager() call
+        if hasattr(self, 'async_engine'):
+            return
+
         settings = get_settings()
-        self.async_engine = create_async_engine(url=settings.SQLALCHEMY_URL)
+        self.async_engine = create_async_engine(url=settings.SQLALCHEMY_URL, **get_engine_options(settings))
         self.async_session = sessionmaker(
             self.async_engine,
             expire_on_commit=False,
             class_=AsyncSession
         )
+        self.read_session = get_read_sessionmaker(self.async_engine)
+
+        self.replica_retry_interval = settings.DB_REPLICA_RETRY_INTERVAL
+        self.replica_engines = [
+            create_async_engine(url=url, **get_engine_options(settings)) for url in settings.SQLALCHEMY_REPLICA_URLS
+        ]
+        self.replica_sessions = [get_read_sessionmaker(engine) for engine in self.replica_engines]
+        self.replica_failed_until = [0.] * len(self.replica_engines)
+        self.replica_index = 0
 
     def __new__(cls):
         if not hasattr(cls, 'instance'):
@@ -30,6 +107,34 @@ class SessionManager:
     def get_session(self) -> Session | AsyncSession:
         return self.async_session()
 
+    def get_read_sessions(self) -> Iterator[tuple[int | None, AsyncSession]]:
+        # healthy replicas in round robin order, the primary is the last resort
+        count = len(self.replica_sessions)
+        start, self.replica_index = self.replica_index, (self.replica_index + 1) % max(count, 1)
+
+        for offset in range(count):
+            index = (start + offset) % count
+            if time.monotonic() >= self.replica_failed_until[index]:
+                yield index, self.replica_sessions[index]()
+
+        yield None, self.read_session()
+
+    def mark_replica_failed(self, index: int) -> None:
+        self.replica_failed_until[index] = time.monotonic() + self.replica_retry_interval
+
+    def get_pool_status(self) -> dict:
+        return self.async_engine.pool.get_status()
+
+    def get_replicas_status(self) -> list[dict]:
+        return [
+            {
+                'host': engine.url.host,
+                'healthy': time.monotonic() >= failed_until,
+                **engine.pool.get_status()
+            }
+            for engine, failed_until in zip(self.replica_engines, self.replica_failed_until)
+        ]
+
     async def get_all_table_names(self):
         async with self.async_engine.connect() as conn:
             tables = await conn.run_sync(
@@ -54,5 +159,30 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
             await async_session.close()
 
 
+async def get_async_read_session() -> AsyncGenerator[AsyncSession, None]:
+    session_manager = SessionManager()
+
+    for replica_index, async_session in session_manager.get_read_sessions():
+        if replica_index is None:
+            break
+
+        try:
+            await async_session.connection()
+            break
+        except (OSError, DBAPIError, asyncio.TimeoutError) as exc:
+            await async_session.close()
+            session_manager.mark_replica_failed(replica_index)
+            logger.warning(f'Replica {replica_index} is unavailable: {exc}')
+
+    async with async_session:
+        try:
+            yield async_session
+        except SQLAlchemyError as exc:
+            logger.error('Get sqlalchemy error')
+            raise exc
+        finally:
+            await async_session.close()
+
+
 async def get_table_names():
     return await SessionManager().get_all_table_names()
@@ -0,0 +1,43 @@
+"""code search
+
+Revision ID: 3f9a6c2d8b41
+Revises: b7d2f91c5e08
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '3f9a6c2d8b41'
+down_revision = 'b7d2f91c5e08'
+branch_labels = None
+depends_on = None
+
+SEARCH_COLUMNS = {
+    'code_characters': ('first_name', 'second_name', 'description'),
+    'code_fractions': ('name', 'description'),
+    'code_locations': ('name', 'description'),
+    'code_items': ('name', 'description'),
+    'code_difference': ('name', 'description'),
+}
+
+
+def upgrade() -> None:
+    for table_name, columns in SEARCH_COLUMNS.items():
+        document = " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+        op.add_column(table_name, sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(f"to_tsvector('russian', {document})", persisted=True),
+            nullable=True
+        ))
+        op.create_index(f'ix_{table_name}_search_vector', table_name, ['search_vector'], unique=False,
+                        postgresql_using='gin')
+
+
+def downgrade() -> None:
+    for table_name in SEARCH_COLUMNS:
+        op.drop_index(f'ix_{table_name}_search_vector', table_name=table_name)
+        op.drop_column(table_name, 'search_vector')
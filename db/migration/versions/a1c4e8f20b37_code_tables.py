@@ -0,0 +1,69 @@
+"""code tables
+
+Revision ID: a1c4e8f20b37
+Revises: e96f2ffb1047
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c4e8f20b37'
+down_revision = 'e96f2ffb1047'
+branch_labels = None
+depends_on = None
+
+CODE_TABLES = {
+    'code_characters': (
+        sa.Column('first_name', sa.String(length=32), nullable=False),
+        sa.Column('second_name', sa.String(length=32), nullable=False),
+    ),
+    'code_fractions': (sa.Column('name', sa.String(length=64), nullable=False), ),
+    'code_locations': (sa.Column('name', sa.String(length=64), nullable=False), ),
+    'code_items': (sa.Column('name', sa.String(length=64), nullable=False), ),
+    'code_difference': (sa.Column('name', sa.String(length=64), nullable=False), ),
+}
+
+
+def upgrade() -> None:
+    # deployed databases got these tables and user.updated_at outside of alembic, only missing ones are created
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if 'updated_at' not in {column['name'] for column in inspector.get_columns('user')}:
+        op.add_column('user', sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True))
+
+    if 'code_files' not in tables:
+        op.create_table('code_files',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('file_format', sa.String(length=10), nullable=False),
+        sa.Column('file_path', sa.String(length=1024), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_code_files_id'), 'code_files', ['id'], unique=False)
+
+    for table_name, columns in CODE_TABLES.items():
+        if table_name in tables:
+            continue
+
+        op.create_table(table_name,
+        sa.Column('id', sa.Integer(), nullable=False),
+        *columns,
+        sa.Column('description', sa.String(length=1024), nullable=True),
+        sa.Column('code_file_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['code_file_id'], ['code_files.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f(f'ix_{table_name}_id'), table_name, ['id'], unique=False)
+
+
+def downgrade() -> None:
+    for table_name in CODE_TABLES:
+        op.drop_index(op.f(f'ix_{table_name}_id'), table_name=table_name)
+        op.drop_table(table_name)
+
+    op.drop_index(op.f('ix_code_files_id'), table_name='code_files')
+    op.drop_table('code_files')
+    op.drop_column('user', 'updated_at')
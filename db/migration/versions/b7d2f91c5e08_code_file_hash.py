@@ -0,0 +1,41 @@
+"""code file hash
+
+Revision ID: b7d2f91c5e08
+Revises: a1c4e8f20b37
+Create Date: 2026-10-18 18:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2f91c5e08'
+down_revision = 'a1c4e8f20b37'
+branch_labels = None
+depends_on = None
+
+CODE_TABLES = ('code_characters', 'code_fractions', 'code_locations', 'code_items', 'code_difference')
+
+
+def upgrade() -> None:
+    op.add_column('code_files', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.add_column('code_files', sa.Column('references', sa.Integer(), server_default='1', nullable=False))
+
+    # one reference per object using the file, files nothing points to keep one so they are never removed
+    usages = ' UNION ALL '.join(f'SELECT code_file_id FROM {table_name}' for table_name in CODE_TABLES)
+    op.execute(
+        'UPDATE code_files SET "references" = GREATEST(usages.count, 1) '
+        f'FROM (SELECT code_file_id, count(*) AS count FROM ({usages}) AS code_objects '
+        'GROUP BY code_file_id) AS usages '
+        'WHERE usages.code_file_id = code_files.id'
+    )
+
+    # existing files keep a null hash, only new uploads are deduplicated
+    op.create_index(op.f('ix_code_files_content_hash'), 'code_files', ['content_hash'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_code_files_content_hash'), table_name='code_files')
+    op.drop_column('code_files', 'references')
+    op.drop_column('code_files', 'content_hash')
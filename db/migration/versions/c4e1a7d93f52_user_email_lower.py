@@ -0,0 +1,26 @@
+"""user email lower
+
+Revision ID: c4e1a7d93f52
+Revises: 3f9a6c2d8b41
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c4e1a7d93f52'
+down_revision = '3f9a6c2d8b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # logins look the email up case-insensitively, an address differing only by case is the same account
+    op.create_index('ix_user_email_lower', 'user', [sa.text('lower(email)')], unique=True)
+    # without statistics on the expression the planner keeps scanning the table until autovacuum runs
+    op.execute('ANALYZE "user"')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_email_lower', table_name='user')
@@ -2,12 +2,13 @@ import datetime
 
 from fastapi import Depends
 from fastapi_users.db import SQLAlchemyBaseUserTable, SQLAlchemyUserDatabase
-from sqlalchemy import Column, String, DateTime, func, ForeignKey, Integer
+from sqlalchemy import Column, String, DateTime, func, ForeignKey, Integer, Index, JSON, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import relationship, declarative_mixin, declared_attr
+from sqlalchemy.orm import relationship, declarative_mixin, declared_attr, deferred
 
 from db import Base
-from db.engine import get_async_session
+from db.engine import get_async_session, get_async_read_session
 
 
 @declarative_mixin
@@ -31,6 +32,19 @@ class User(TimestampMixin, SQLAlchemyBaseUserTable, Base):
     second_name = Column(String(30), nullable=False)
 
 
+# logins compare lower(email), the plain email index does not cover it and lets case variants in
+Index('ix_user_email_lower', func.lower(User.email), unique=True)
+
+
+SEARCH_CONFIG = 'russian'
+
+
+def get_search_vector(*columns: str) -> Column:
+    # generated by postgres from the text columns, deferred so plain reads do not load it
+    document = " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+    return deferred(Column(TSVECTOR, Computed(f"to_tsvector('{SEARCH_CONFIG}', {document})", persisted=True)))
+
+
 @declarative_mixin
 class CodeFileClass:
     @declared_attr
@@ -50,6 +64,8 @@ class CodeCharacter(Base, CodeFileClass):
 
     description = Column(String(1024))
 
+    search_vector = get_search_vector('first_name', 'second_name', 'description')
+
 
 class CodeFraction(Base, CodeFileClass):
     __tablename__ = 'code_fractions'
@@ -58,6 +74,8 @@ class CodeFraction(Base, CodeFileClass):
 
     description = Column(String(1024))
 
+    search_vector = get_search_vector('name', 'description')
+
 
 class CodeLocation(Base, CodeFileClass):
     __tablename__ = 'code_locations'
@@ -66,6 +84,8 @@ class CodeLocation(Base, CodeFileClass):
 
     description = Column(String(1024))
 
+    search_vector = get_search_vector('name', 'description')
+
 
 class CodeItem(Base, CodeFileClass):
     __tablename__ = 'code_items'
@@ -74,6 +94,8 @@ class CodeItem(Base, CodeFileClass):
 
     description = Column(String(1024))
 
+    search_vector = get_search_vector('name', 'description')
+
 
 class CodeDifferent(Base, CodeFileClass):
     __tablename__ = 'code_difference'
@@ -82,6 +104,14 @@ class CodeDifferent(Base, CodeFileClass):
 
     description = Column(String(1024))
 
+    search_vector = get_search_vector('name', 'description')
+
+
+search_indexes = [
+    Index(f'ix_{code_class.__tablename__}_search_vector', code_class.search_vector, postgresql_using='gin')
+    for code_class in (CodeCharacter, CodeFraction, CodeLocation, CodeItem, CodeDifferent)
+]
+
 
 class CodeFile(Base):
     __tablename__ = 'code_files'
@@ -89,6 +119,29 @@ class CodeFile(Base):
     file_format = Column(String(10), nullable=False)
     file_path = Column(String(1024), nullable=False)
 
+    content_hash = Column(String(64), index=True, unique=True, nullable=True)
+    references = Column(Integer, nullable=False, default=1, server_default='1')
+
+
+class BackgroundJob(TimestampMixin, Base):
+    __tablename__ = 'background_jobs'
+    __table_args__ = (
+        Index('ix_background_jobs_status_run_at', 'status', 'run_at'),
+        {'extend_existing': True},
+    )
+
+    name = Column(String(64), nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+
+    status = Column(String(16), nullable=False, default='pending')
+    attempts = Column(Integer, nullable=False, default=0)
+    run_at = Column(DateTime, nullable=False, server_default=func.now())
+    last_error = Column(String(1024))
+
 
 async def get_user_db(session: AsyncSession = Depends(get_async_session)):
     yield SQLAlchemyUserDatabase(session, User)
+
+
+async def get_read_user_db(session: AsyncSession = Depends(get_async_read_session)):
+    yield SQLAlchemyUserDatabase(session, User)
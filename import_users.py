@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+from fastapi_users.password import PasswordHelper
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert
+
+from db import User
+from db.engine import SessionManager
+from routers.schemas import UserCreate
+
+password_helper = PasswordHelper()
+
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    return [password_helper.hash(password) for password in passwords]
+
+
+def read_rows(path: str, file_format: str) -> Iterator[tuple[int, dict | str]]:
+    with open(path, encoding='utf-8', newline='') as users_file:
+        if file_format == 'csv':
+            reader = csv.DictReader(users_file)
+            for row in reader:
+                yield reader.line_num, row
+            return
+
+        for line_number, line in enumerate(users_file, start=1):
+            if line.strip():
+                yield line_number, line
+
+
+def parse_row(row: dict | str) -> dict:
+    if isinstance(row, str):
+        return json.loads(row)
+
+    # DictReader keeps extra values under None and fills missing columns with None
+    if None in row or None in row.values():
+        raise ValueError('wrong number of columns')
+    return row
+
+
+def read_batches(path: str, file_format: str, batch_size: int, stats: dict) -> Iterator[list[UserCreate]]:
+    batch = []
+
+    for line_number, row in read_rows(path, file_format):
+        try:
+            batch.append(UserCreate(**parse_row(row)))
+        except ValidationError as error:
+            stats['invalid'] += 1
+            print(f'row {line_number} skipped: {"; ".join(item["msg"] for item in error.errors())}')
+            continue
+        except (ValueError, TypeError) as error:
+            # malformed json, a json value that is not an object, a csv row with a wrong number of columns
+            stats['invalid'] += 1
+            print(f'row {line_number} skipped: {error}')
+            continue
+
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def hash_batch(executor: ProcessPoolExecutor, users: list[UserCreate], workers: int) -> asyncio.Future:
+    loop = asyncio.get_running_loop()
+    chunk_size = -(-len(users) // workers)
+    passwords = [user.password for user in users]
+
+    return asyncio.gather(*(
+        loop.run_in_executor(executor, hash_passwords, passwords[index:index + chunk_size])
+        for index in range(0, len(passwords), chunk_size)
+    ))
+
+
+async def insert_batch(users: list[UserCreate], hashing: asyncio.Future, stats: dict) -> None:
+    hashed_passwords = [hashed_password for chunk in await hashing for hashed_password in chunk]
+
+    rows = []
+    for user, hashed_password in zip(users, hashed_passwords):
+        user_dict = user.create_update_dict()
+        user_dict.pop('password')
+        rows.append({
+            **user_dict,
+            'hashed_password': hashed_password,
+            'is_active': True,
+            'is_superuser': False,
+            'is_verified': False,
+        })
+
+    # existing emails and usernames are skipped, not updated, every unique index is an arbiter,
+    # ix_user_email_lower catches an email differing only by case, in the table or earlier in the batch
+    statement = insert(User).values(rows).on_conflict_do_nothing().returning(User.id)
+
+    async with SessionManager().get_session() as session:
+        inserted = len((await session.execute(statement)).all())
+        await session.commit()
+
+    stats['inserted'] += inserted
+    stats['existing'] += len(rows) - inserted
+    print(f'{stats["inserted"]} users imported, {stats["existing"]} already exist, {stats["invalid"]} invalid')
+
+
+async def import_users(path: str, file_format: str, batch_size: int, workers: int) -> dict:
+    stats = {'inserted': 0, 'existing': 0, 'invalid': 0}
+
+    with ProcessPoolExecutor(workers) as executor:
+        # the next batch is hashed while the previous one is inserted
+        pending = None
+        for users in read_batches(path, file_format, batch_size, stats):
+            hashing = hash_batch(executor, users, workers)
+            if pending is not None:
+                await insert_batch(*pending, stats)
+            pending = users, hashing
+
+        if pending is not None:
+            await insert_batch(*pending, stats)
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import users from a csv or jsonl file')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=('csv', 'jsonl'), default=None,
+                        help='file format, by default taken from the file extension')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='users per insert, asyncpg allows 32767 parameters (about 3000 users)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    file_format = args.format or ('csv' if args.path.endswith('.csv') else 'jsonl')
+    stats = asyncio.run(import_users(args.path, file_format, args.batch_size, args.workers))
+    print(f'done: {stats}')
+
+
+if __name__ == '__main__':
+    main()
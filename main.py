@@ -7,9 +7,12 @@ from fastapi.responses import JSONResponse
 from fastapi_pagination import add_pagination
 
 from config import get_settings
-from controllers.user_controller import fastapi_users, auth_backend
+from controllers.saving_files import UploadSizeLimitMiddleware, get_max_file_size, MULTIPART_OVERHEAD
+from controllers.user_controller import fastapi_users, auth_backend, get_users_router
+from processes.background_jobs import get_job_queue
 from processes.vk import vk_process
 from processes.processes_manager import get_processes_manager
+from processes.shared_feed import SharedFeed
 from routers import __all__ as routers
 from routers.schemas import UserRead, UserCreate, UserUpdate
 
@@ -26,6 +29,11 @@ def get_application(settings) -> FastAPI:
         description='LoS | Minecraft Project'
     )
 
+    application.add_middleware(
+        UploadSizeLimitMiddleware,
+        max_body_size=get_max_file_size() + MULTIPART_OVERHEAD
+    )
+
     application.add_middleware(
         CORSMiddleware,
         allow_origins=origins,
@@ -53,7 +61,7 @@ def get_application(settings) -> FastAPI:
     )
 
     application.include_router(
-        fastapi_users.get_users_router(UserRead, UserUpdate),
+        get_users_router(UserRead, UserUpdate),
         prefix="/users",
         tags=["users"],
     )
@@ -68,14 +76,39 @@ def get_application(settings) -> FastAPI:
             content={"message": "miss docker container"},
         )
 
+    processes_manager = get_processes_manager()
+    job_queue = get_job_queue()
+
+    @application.on_event('startup')
+    async def start_vk_tasks():
+        if settings.VK_ASYNC_MODE and settings.WORKERS == 1:
+            processes_manager.start_vk_poller()
+        else:
+            processes_manager.start_vk_watcher()
+
+    @application.on_event('shutdown')
+    async def stop_vk_tasks():
+        await processes_manager.stop_vk_poller()
+        await processes_manager.stop_vk_watcher()
+
+    @application.on_event('startup')
+    async def start_background_jobs():
+        job_queue.start()
+
+    @application.on_event('shutdown')
+    async def stop_background_jobs():
+        await job_queue.stop()
+
     add_pagination(application)
 
     return application
 
 
-def run_application(settings):
-    app = get_application(settings)
+def create_application() -> FastAPI:
+    return get_application(get_settings())
+
 
+def run_application(settings):
     server_data = {
         'host': settings.SERVER_HOST,
         'port': settings.SERVER_PORT
@@ -84,15 +117,31 @@ def run_application(settings):
     if not settings.DEBUG:
         server_data.update(settings.SSL_DATA)
 
-    uvicorn.run(app, **server_data)
+    if settings.WORKERS > 1:
+        uvicorn.run('main:create_application', factory=True, workers=settings.WORKERS, **server_data)
+    else:
+        uvicorn.run(get_application(settings), **server_data)
 
 
-def run_vk_process(get_queue: Queue, send_queue: Queue):
-    Process(target=vk_process, args=(get_queue, send_queue)).start()
+def run_vk_process(get_queue: Queue, send_queue: Queue, shared_memory_name: str | None = None):
+    Process(target=vk_process, args=(get_queue, send_queue, shared_memory_name)).start()
 
 
 if __name__ == '__main__':
+    settings = get_settings()
     processes_manager = get_processes_manager()
 
-    run_vk_process(processes_manager.VK_GET_QUEUE, processes_manager.VK_SEND_QUEUE)
-    run_application(get_settings())
+    if settings.WORKERS > 1:
+        # one producer for every worker, the snapshot is shared through memory
+        shared_feed = SharedFeed(settings.VK_SHARED_MEMORY_NAME, settings.VK_SHARED_MEMORY_SIZE * 1024 * 1024,
+                                 create=True)
+        try:
+            run_vk_process(processes_manager.VK_GET_QUEUE, processes_manager.VK_SEND_QUEUE,
+                           settings.VK_SHARED_MEMORY_NAME)
+            run_application(settings)
+        finally:
+            shared_feed.close()
+    else:
+        if not settings.VK_ASYNC_MODE:
+            run_vk_process(processes_manager.VK_GET_QUEUE, processes_manager.VK_SEND_QUEUE)
+        run_application(settings)
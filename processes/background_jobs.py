@@ -0,0 +1,137 @@
+import asyncio
+import datetime
+from functools import lru_cache
+from typing import Awaitable, Callable
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import get_settings
+from db import BackgroundJob
+from db.engine import SessionManager
+
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_FAILED = 'failed'
+
+JobHandler = Callable[[dict], Awaitable[None]]
+
+
+class JobQueueError(Exception): ...
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.utcnow()
+
+
+class JobQueue:
+    def __init__(self):
+        settings = get_settings()
+        self.workers_count = settings.JOB_WORKERS
+        self.poll_interval = settings.JOB_POLL_INTERVAL
+        self.lease = datetime.timedelta(seconds=settings.JOB_LEASE)
+        self.retry_delay = settings.JOB_RETRY_DELAY
+        self.max_attempts = settings.JOB_MAX_ATTEMPTS
+
+        self.handlers: dict[str, JobHandler] = {}
+        self.workers: list[asyncio.Task] = []
+        self.wakeup = asyncio.Event()
+
+    def handler(self, name: str) -> Callable[[JobHandler], JobHandler]:
+        def decorator(function: JobHandler) -> JobHandler:
+            self.handlers[name] = function
+            return function
+
+        return decorator
+
+    async def enqueue(self, session: AsyncSession, name: str, payload: dict, delay: float = 0) -> None:
+        # committed together with whatever the session already holds
+        if name not in self.handlers:
+            raise JobQueueError(f'unknown job: {name}')
+
+        session.add(BackgroundJob(name=name, payload=payload, status=JOB_PENDING, attempts=0,
+                                  run_at=utcnow() + datetime.timedelta(seconds=delay)))
+        await session.commit()
+        self.wakeup.set()
+
+    async def claim(self) -> BackgroundJob | None:
+        now = utcnow()
+        statement = select(BackgroundJob) \
+            .where(BackgroundJob.status.in_((JOB_PENDING, JOB_RUNNING)), BackgroundJob.run_at <= now) \
+            .order_by(BackgroundJob.run_at) \
+            .limit(1) \
+            .with_for_update(skip_locked=True)
+
+        async with SessionManager().get_session() as session:
+            job: BackgroundJob | None = (await session.execute(statement)).scalar()
+            if job is None:
+                return None
+
+            job.status = JOB_RUNNING
+            job.attempts += 1
+            # a lease, the job is picked up again if this worker dies while running it
+            job.run_at = now + self.lease
+            await session.commit()
+            return job
+
+    async def finish(self, job: BackgroundJob, error: Exception | None) -> None:
+        if error is None:
+            statement = delete(BackgroundJob).where(BackgroundJob.id == job.id)
+        elif job.attempts >= self.max_attempts:
+            statement = update(BackgroundJob).where(BackgroundJob.id == job.id) \
+                .values(status=JOB_FAILED, last_error=str(error)[:1024])
+        else:
+            run_at = utcnow() + datetime.timedelta(seconds=self.retry_delay * 2 ** (job.attempts - 1))
+            statement = update(BackgroundJob).where(BackgroundJob.id == job.id) \
+                .values(status=JOB_PENDING, run_at=run_at, last_error=str(error)[:1024])
+
+        async with SessionManager().get_session() as session:
+            await session.execute(statement)
+            await session.commit()
+
+    async def run_job(self, job: BackgroundJob) -> None:
+        error = None
+        try:
+            if (handler := self.handlers.get(job.name)) is None:
+                raise JobQueueError(f'unknown job: {job.name}')
+            await handler(job.payload)
+        except Exception as exc:
+            error = exc
+            print(f'background job {job.id} {job.name} error: {exc}')
+
+        await self.finish(job, error)
+
+    async def work(self):
+        while True:
+            self.wakeup.clear()
+
+            try:
+                job = await self.claim()
+                if job is not None:
+                    await self.run_job(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                print(f'background jobs error: {error}')
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if not self.workers:
+            self.workers = [asyncio.create_task(self.work()) for _ in range(self.workers_count)]
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+
+@lru_cache
+def get_job_queue() -> JobQueue:
+    return JobQueue()
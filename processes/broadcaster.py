@@ -0,0 +1,70 @@
+import asyncio
+import json
+from collections import deque
+from typing import AsyncIterator, Callable
+
+
+def format_event(event_id: int, event: str, data) -> bytes:
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'.encode()
+
+
+class Subscription:
+    __slots__ = ('queue', 'closed')
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(queue_size)
+        self.closed = False
+
+
+class Broadcaster:
+    def __init__(self, history_size: int = 100, queue_size: int = 16, keepalive: float = 15):
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+
+        self.subscriptions: set[Subscription] = set()
+        self.history: deque[tuple[int, bytes]] = deque(maxlen=history_size)
+
+    def __len__(self) -> int:
+        return len(self.subscriptions)
+
+    def publish(self, event_id: int, message: bytes) -> None:
+        self.history.append((event_id, message))
+
+        for subscription in tuple(self.subscriptions):
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # too slow, the client reconnects and resumes from history
+                subscription.closed = True
+                self.subscriptions.discard(subscription)
+
+    def get_replay(self, last_event_id: int | None, snapshot: Callable[[], tuple[int, bytes]]) -> list[bytes]:
+        version, message = snapshot()
+
+        if last_event_id is None or last_event_id == version:
+            return [] if last_event_id is not None else [message]
+
+        # each entry is a diff from the entry before it, a worker syncing the shared snapshot skips versions,
+        # so only a version this worker published is a valid base, any other one gets the reset
+        event_ids = [event_id for event_id, _ in self.history]
+        if last_event_id in event_ids:
+            return [message for _, message in list(self.history)[event_ids.index(last_event_id) + 1:]]
+
+        return [message]
+
+    async def subscribe(self, last_event_id: int | None,
+                        snapshot: Callable[[], tuple[int, bytes]]) -> AsyncIterator[bytes]:
+        subscription = Subscription(self.queue_size)
+        self.subscriptions.add(subscription)
+
+        try:
+            for message in self.get_replay(last_event_id, snapshot):
+                yield message
+
+            while not subscription.closed or not subscription.queue.empty():
+                try:
+                    yield await asyncio.wait_for(subscription.queue.get(), timeout=self.keepalive)
+                except asyncio.TimeoutError:
+                    yield b': ping\n\n'
+        finally:
+            self.subscriptions.discard(subscription)
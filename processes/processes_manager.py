@@ -1,5 +1,12 @@
+import asyncio
 from functools import lru_cache
 from multiprocessing import Queue
+from queue import Empty
+
+from config import get_settings
+from processes.broadcaster import Broadcaster, format_event
+from processes.shared_feed import SharedFeed
+from processes.vk_feed import VkFeed, VkFeedDelta, VK_FEED_RESET, VK_FEED_DELETE
 
 
 class ProcessesManagerError(Exception): ...
@@ -8,14 +15,124 @@ class ProcessesManagerError(Exception): ...
 class ProcessesManager:
     VK_GET_QUEUE: Queue = Queue()
     VK_SEND_QUEUE: Queue = Queue()
-    VK_DATA: dict = None
+
+    def __init__(self):
+        settings = get_settings()
+
+        self.vk_feed = VkFeed(settings.VK_FEED_SIZE)
+        self.vk_poller = None
+        self.vk_task: asyncio.Task | None = None
+        self.vk_watch_task: asyncio.Task | None = None
+        self.shared_feed: SharedFeed | None = None
+
+        self.vk_broadcaster = Broadcaster(settings.VK_STREAM_HISTORY, settings.VK_STREAM_QUEUE_SIZE,
+                                          settings.VK_STREAM_KEEPALIVE)
+        self.vk_snapshot: tuple[int, bytes] | None = None
+
+    def get_shared_feed(self) -> SharedFeed | None:
+        settings = get_settings()
+        if self.shared_feed is None and settings.WORKERS > 1:
+            try:
+                self.shared_feed = SharedFeed(settings.VK_SHARED_MEMORY_NAME)
+            except FileNotFoundError:
+                return None
+
+        return self.shared_feed
+
+    @staticmethod
+    def get_vk_event(version: int, deltas: list[VkFeedDelta]) -> bytes:
+        changes = []
+        for action, value in deltas:
+            if action == VK_FEED_DELETE:
+                changes.append({'action': action, 'post_id': value})
+            elif action == VK_FEED_RESET:
+                changes.append({'action': action, 'items': [record._asdict() for record in value]})
+            else:
+                changes.append({'action': action, 'item': value._asdict()})
+
+        return format_event(version, 'feed', {'version': version, 'changes': changes})
+
+    def get_vk_snapshot(self) -> tuple[int, bytes]:
+        if self.vk_snapshot is None or self.vk_snapshot[0] != self.vk_feed.version:
+            version = self.vk_feed.version
+            self.vk_snapshot = version, self.get_vk_event(version, [(VK_FEED_RESET, self.vk_feed.items())])
+
+        return self.vk_snapshot
+
+    def notify_vk_data(self, message: tuple[int, list[VkFeedDelta]]):
+        version, deltas = message
+        if deltas:
+            self.vk_broadcaster.publish(version, self.get_vk_event(version, deltas))
 
     def update_vk_data(self):
-        if not self.VK_GET_QUEUE.empty():
-            self.VK_DATA = self.VK_GET_QUEUE.get(timeout=float('-inf'))
+        if self.vk_poller is not None:
+            return
+
+        if (shared_feed := self.get_shared_feed()) is not None:
+            if (snapshot := shared_feed.read(self.vk_feed.version)) is not None:
+                version, records = snapshot
+                deltas = self.vk_feed.diff(records)
+                self.vk_feed.apply([(VK_FEED_RESET, records)], version)
+                self.notify_vk_data((version, deltas))
+            return
+
+        while True:
+            try:
+                version, deltas = self.VK_GET_QUEUE.get_nowait()
+            except Empty:
+                return
+            self.vk_feed.apply(deltas, version)
+            self.notify_vk_data((version, deltas))
 
     def forced_update_vk_data(self):
-        self.VK_SEND_QUEUE.put('force_update')
+        if self.vk_poller is not None:
+            self.vk_poller.force_update()
+        elif (shared_feed := self.get_shared_feed()) is not None:
+            shared_feed.request_update()
+        else:
+            self.VK_SEND_QUEUE.put('force_update')
+
+    async def watch_vk_data(self):
+        while True:
+            self.update_vk_data()
+            await asyncio.sleep(get_settings().VK_SYNC_INTERVAL)
+
+    def start_vk_poller(self):
+        from processes.vk import VkPoller
+
+        if self.vk_task is not None:
+            raise ProcessesManagerError('vk poller already started')
+
+        self.vk_poller = VkPoller(self.vk_feed, self.notify_vk_data)
+        self.vk_task = asyncio.create_task(self.vk_poller.run())
+
+    async def stop_vk_poller(self):
+        if self.vk_task is None:
+            return
+
+        self.vk_task.cancel()
+        try:
+            await self.vk_task
+        except asyncio.CancelledError:
+            pass
+
+        self.vk_poller, self.vk_task = None, None
+
+    def start_vk_watcher(self):
+        if self.vk_watch_task is None:
+            self.vk_watch_task = asyncio.create_task(self.watch_vk_data())
+
+    async def stop_vk_watcher(self):
+        if self.vk_watch_task is None:
+            return
+
+        self.vk_watch_task.cancel()
+        try:
+            await self.vk_watch_task
+        except asyncio.CancelledError:
+            pass
+
+        self.vk_watch_task = None
 
 
 @lru_cache
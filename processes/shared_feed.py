@@ -0,0 +1,75 @@
+import pickle
+import struct
+from multiprocessing import shared_memory
+
+from processes.vk_feed import VkNewsRecord
+
+# sequence (odd while the producer is writing), version, payload length, forced update requests
+HEADER = struct.Struct('QQQQ')
+READ_ATTEMPTS = 100
+
+
+class SharedFeedError(Exception): ...
+
+
+class SharedFeed:
+    def __init__(self, name: str, size: int = 0, create: bool = False):
+        self.memory = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self.buffer = self.memory.buf
+        self.create = create
+
+        if create:
+            HEADER.pack_into(self.buffer, 0, 0, 0, 0, 0)
+
+        self.update_requests = self.get_header()[3]
+
+    def get_header(self) -> tuple[int, int, int, int]:
+        return HEADER.unpack_from(self.buffer, 0)
+
+    def write(self, version: int, records: list[VkNewsRecord]) -> None:
+        payload = pickle.dumps([tuple(record) for record in records], protocol=pickle.HIGHEST_PROTOCOL)
+        if HEADER.size + len(payload) > self.memory.size:
+            raise SharedFeedError(f'feed snapshot {len(payload)} bytes does not fit shared memory')
+
+        sequence = self.get_header()[0]
+        struct.pack_into('Q', self.buffer, 0, sequence + 1)
+
+        self.buffer[HEADER.size:HEADER.size + len(payload)] = payload
+        struct.pack_into('QQQ', self.buffer, 0, sequence + 1, version, len(payload))
+
+        struct.pack_into('Q', self.buffer, 0, sequence + 2)
+
+    def read(self, known_version: int | None = None) -> tuple[int, list[VkNewsRecord]] | None:
+        for _ in range(READ_ATTEMPTS):
+            sequence, version, length, _ = self.get_header()
+            if not sequence or version == known_version:
+                return None
+            if sequence % 2:
+                continue
+
+            payload = bytes(self.buffer[HEADER.size:HEADER.size + length])
+            if self.get_header()[0] != sequence:
+                continue
+
+            return version, [VkNewsRecord(*record) for record in pickle.loads(payload)]
+
+        return None
+
+    def request_update(self) -> None:
+        offset = HEADER.size - 8
+        struct.pack_into('Q', self.buffer, offset, struct.unpack_from('Q', self.buffer, offset)[0] + 1)
+
+    def is_update_requested(self) -> bool:
+        update_requests = self.get_header()[3]
+        if update_requests == self.update_requests:
+            return False
+
+        self.update_requests = update_requests
+        return True
+
+    def close(self) -> None:
+        self.buffer = None
+        self.memory.close()
+
+        if self.create:
+            self.memory.unlink()
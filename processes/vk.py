@@ -1,85 +1,48 @@
+import asyncio
 import datetime
 import os
-from multiprocessing import Queue
+from multiprocessing.queues import Queue
+from typing import Callable
 
+import aiohttp
 from blingfire import text_to_sentences
 from dotenv import load_dotenv
-from requests import get
 
 from config import get_settings
-from routers.schemas import VkNewsRead
+from controllers.cache_controller import LRUCache
+from processes.shared_feed import SharedFeed
+from processes.vk_snapshot import save_snapshot, load_snapshot, get_snapshot
+from processes.vk_feed import VkFeed, VkNewsRecord, VkFeedDelta, VK_FEED_ADD, VK_FEED_EDIT, VK_FEED_RESET
+
+VK_API_URL = 'https://api.vk.com/method'
+VK_API_VERSION = 5.131
 
 
 class VkProcessError(Exception): ...
 
 
-def print_time_log(process_name, function, *args, **kwargs):
+async def print_time_log(process_name, function, *args, **kwargs):
     started_time = datetime.datetime.now()
-    output_data = function(*args, **kwargs)
+    output_data = await function(*args, **kwargs)
     print(f'{process_name} iteration duration: {datetime.datetime.now() - started_time}')
     return output_data
 
 
-def get_load_vk_data() -> dict:
-    params = {
-        'access_token': os.getenv('VK_SERVER_KEY'),
-        'owner_id': f'-{os.getenv("VK_GROUP_ID")}',
-        'v': 5.131
-    }
-
-    data = get('https://api.vk.com/method/wall.get', params=params)
-    json = data.json()
-
-    if data.status_code == 200 and 'response' in json:
-        return json['response']
-    raise VkProcessError(f'get_load_vk_data: {json}')
-
-
-def get_long_poll_data() -> dict:
-    load_dotenv()
-
-    params = {
-        'access_token': os.getenv('VK_GROUP_KEY'),
-        'group_id': os.getenv('VK_GROUP_ID'),
-        'v': 5.131
-    }
-
-    data = get('https://api.vk.com/method/groups.getLongPollServer', params=params)
-    json = data.json()
-
-    if data.status_code == 200 and 'response' in json:
-        return json['response']
-    raise VkProcessError(f'get_long_poll_data: {json}')
-
-
-def get_long_poll_changes(data: dict, time: int) -> dict | str | None:
-    response = get(f'{data["server"]}?act=a_check&key={data["key"]}&ts={data["ts"]}&wait={time}')
-    json = response.json()
-
-    if response.status_code == 200 and 'ts' in json and 'updates' in json:
-        data['ts'] = json['ts']
-        if json['updates']:
-            return process_data_dict(json['updates'][0]['object'])
-        return
-    elif 'failed' in json and json['failed'] == 2:
-        return 'update_long_poll_data'
-    raise VkProcessError(f'get_long_poll_changes: {json}')
-
-
-def process_data_dict(data: dict) -> VkNewsRead | None:
+def process_data_dict(data: dict) -> VkNewsRecord | None:
     if 'text' not in data:
         return
 
     sentences = text_to_sentences(data['text']).split('\n')
 
     output_dict = {
+        'post_id': data['id'],
         'title': sentences[0] if sentences[0] else None,
         'content': ' '.join(sentences[1:10]) if data['text'] else None,
         'image_url': None,
         'link': f'https://vk.com/wall-{os.getenv("VK_GROUP_ID")}_{data["id"]}'
     }
 
-    for content in data['attachments']:
+    for content in data.get('attachments', ()):
         if content['type'] not in {'photo', 'video', 'link'}:
             continue
 
@@ -91,51 +54,286 @@ def process_data_dict(data: dict) -> VkNewsRead | None:
         elif 'sizes' in content:
             output_dict['image_url'] = content['sizes'][-1]['url']
 
-    return VkNewsRead(**output_dict)
+    return VkNewsRecord(**output_dict)
 
 
-def get_base_output_data():
-    output_data = []
-    for dictionary in get_load_vk_data()['items']:
-        output_data += [process_data_dict(dictionary)]
-
-    return output_data
+def process_wall_post_new(data: dict,
+                          process: Callable[[dict], VkNewsRecord | None] = process_data_dict) -> VkFeedDelta | None:
+    # suggested and postponed posts are not published on the wall yet
+    if data.get('post_type', 'post') != 'post':
+        return
 
+    if (record := process(data)) is not None:
+        return VK_FEED_ADD, record
 
-def vk_process(connection_send: Queue, connection_get: Queue):
-    print('vk_process started')
 
-    wait_time = os.getenv('VK_WAIT')
-    settings = get_settings()
-    data_dict = get_long_poll_data()
+# vk long poll has no wall post edit/delete events, those are picked up by wall.get refreshes
+LONG_POLL_HANDLERS: dict[str, Callable[[dict, Callable[[dict], VkNewsRecord | None]], VkFeedDelta | None]] = {
+    'wall_post_new': process_wall_post_new,
+}
+
+
+class VkPoller:
+    def __init__(self, feed: VkFeed, publish: Callable[[tuple[int, list[VkFeedDelta]]], None] | None = None,
+                 commands: Queue | None = None, shared_feed: SharedFeed | None = None):
+        self.settings = get_settings()
+        self.feed = feed
+        self.publish = publish
+        self.commands = commands
+        self.shared_feed = shared_feed
+
+        self.session: aiohttp.ClientSession | None = None
+        self.force_update_event = asyncio.Event()
+
+        self.long_poll_data: dict | None = None
+        self.loaded = False
+        self.reconcile = False
+        self.snapshot_changed = False
+
+        # post id -> (edit hash, record), so unchanged posts are not split into sentences again
+        self.processed_posts = LRUCache(feed.capacity * 2)
+
+    async def get_json(self, url: str, params: dict) -> tuple[int, dict]:
+        async with self.session.get(url, params=params) as response:
+            return response.status, await response.json(content_type=None)
+
+    async def get_load_vk_data(self, offset: int = 0, count: int = 100) -> dict:
+        params = {
+            'access_token': os.getenv('VK_SERVER_KEY'),
+            'owner_id': f'-{os.getenv("VK_GROUP_ID")}',
+            'offset': offset,
+            'count': count,
+            'v': VK_API_VERSION
+        }
+
+        status, json = await self.get_json(f'{VK_API_URL}/wall.get', params)
+
+        if status == 200 and 'response' in json:
+            return json['response']
+        raise VkProcessError(f'get_load_vk_data: {json}')
+
+    async def get_long_poll_data(self) -> dict:
+        load_dotenv()
+
+        params = {
+            'access_token': os.getenv('VK_GROUP_KEY'),
+            'group_id': os.getenv('VK_GROUP_ID'),
+            'v': VK_API_VERSION
+        }
+
+        status, json = await self.get_json(f'{VK_API_URL}/groups.getLongPollServer', params)
+
+        if status == 200 and 'response' in json:
+            return json['response']
+        raise VkProcessError(f'get_long_poll_data: {json}')
+
+    def process_updates(self, updates: list[dict]) -> list[VkFeedDelta]:
+        deltas = []
+        post_ids = set()
+
+        for update in updates:
+            if (handler := LONG_POLL_HANDLERS.get(update.get('type'))) is None:
+                continue
+
+            # one malformed post must not drop the rest of the batch
+            try:
+                delta = handler(update['object'], self.process_post)
+            except Exception as error:
+                print(f'vk_process skipped {update.get("type")} update: {error!r}')
+                continue
+
+            if delta is None:
+                continue
+
+            action, record = delta
+            if action == VK_FEED_ADD and (record.post_id in self.feed or record.post_id in post_ids):
+                action = VK_FEED_EDIT
+
+            post_ids.add(record.post_id)
+            deltas.append((action, record))
+
+        return deltas
+
+    async def get_long_poll_changes(self, time: int) -> list[VkFeedDelta] | str:
+        data = self.long_poll_data
+        params = {'act': 'a_check', 'key': data['key'], 'ts': data['ts'], 'wait': time}
+
+        status, json = await self.get_json(data['server'], params)
+
+        if status == 200 and 'ts' in json and 'updates' in json:
+            deltas = await asyncio.to_thread(self.process_updates, json['updates'])
+            # moved only after the batch is processed, a failure before this point fetches it again
+            if data['ts'] != json['ts']:
+                data['ts'] = json['ts']
+                self.snapshot_changed = True
+            return deltas
+        elif json.get('failed') == 1:
+            # events were lost, take the new ts and reload the wall
+            data['ts'] = json['ts']
+            self.reconcile = True
+            return []
+        elif json.get('failed') == 2:
+            # only the key expired, keep reading from the same ts
+            self.long_poll_data = {**(await self.get_long_poll_data()), 'ts': data['ts']}
+            return []
+        elif json.get('failed') == 3:
+            self.reconcile = True
+            return 'update_long_poll_data'
+        raise VkProcessError(f'get_long_poll_changes: {json}')
+
+    def process_post(self, data: dict) -> VkNewsRecord | None:
+        # attachment ids, a swapped photo keeps the count but changes the image url
+        attachments = tuple(
+            (attachment['type'], attachment.get(attachment['type'], {}).get('id'))
+            for attachment in data.get('attachments', ())
+        )
+        edit_hash = hash((data.get('edited'), data.get('text'), attachments))
+
+        if (cached := self.processed_posts.get(data['id'])) is not None and cached[0] == edit_hash:
+            return cached[1]
+
+        record = process_data_dict(data)
+        self.processed_posts.set(data['id'], (edit_hash, record))
+        return record
+
+    def process_posts(self, posts: list[dict]) -> list[VkNewsRecord]:
+        return [record for post in posts if (record := self.process_post(post)) is not None]
+
+    async def get_wall_posts(self, newest_post_id: int | None = None) -> list[dict]:
+        page_size = self.settings.VK_WALL_PAGE_SIZE if newest_post_id is not None else 100
+        posts = []
+
+        while len(posts) < self.feed.capacity:
+            items = (await self.get_load_vk_data(len(posts), min(page_size, self.feed.capacity - len(posts))))['items']
+            posts += items
+
+            if newest_post_id is not None and any(
+                    item['id'] <= newest_post_id and not item.get('is_pinned') for item in items):
+                break
+            if len(items) < page_size:
+                break
+
+        if newest_post_id is not None:
+            posts = [post for post in posts if post['id'] > newest_post_id]
+        return posts
+
+    async def refresh(self, full: bool):
+        newest_post_id = None if full else self.feed.newest_post_id()
+        # sentence splitting is cpu bound, in async mode it would stall the api event loop
+        records = await asyncio.to_thread(self.process_posts, await self.get_wall_posts(newest_post_id))
+
+        if newest_post_id is None:
+            if self.feed.diff(records):
+                self.apply([(VK_FEED_RESET, records)])
+        elif records:
+            self.apply([(VK_FEED_ADD, record) for record in reversed(records)])
+
+    def load_feed_snapshot(self):
+        try:
+            snapshot = load_snapshot(self.settings.VK_SNAPSHOT_PATH)
+        except Exception as error:
+            print(f'vk_process snapshot error: {error}')
+            return
 
-    output_data = get_base_output_data()
+        if snapshot is None:
+            return
 
-    connection_send.put(output_data)
+        records, self.long_poll_data = snapshot
+        # a fresh version, changes made after the snapshot was saved may have used the saved ones
+        self.apply([(VK_FEED_RESET, records)])
+        self.loaded = True
+        self.reconcile = True
+        self.snapshot_changed = False
+        print(f'vk_process loaded {len(records)} posts from snapshot')
 
-    while True:
-        if not connection_get.empty():
-            if 'force_update' in connection_get.get():
-                output_data = get_base_output_data()
-                connection_send.put(output_data)
+    async def save_feed_snapshot(self):
+        self.snapshot_changed = False
+        snapshot = get_snapshot(self.feed, self.long_poll_data)
 
         try:
-            if settings.VK_PROCESS_DEBUG:
-                data = print_time_log('vk_process', get_long_poll_changes, data_dict, wait_time)
-            else:
-                data = get_long_poll_changes(data_dict, wait_time)
-
-            if data == 'update_long_poll_data':
-                data_dict = get_long_poll_data()
-            elif data:
-                if settings.VK_PROCESS_DEBUG:
-                    print(data)
-                if len(output_data) == 100:
-                    output_data = [data] + output_data[:-1]
-                else:
-                    output_data = [data] + output_data
-
-                print(f'sending data: {output_data}')
-                connection_send.put(output_data)
+            await asyncio.to_thread(save_snapshot, self.settings.VK_SNAPSHOT_PATH, snapshot)
         except Exception as error:
-            print(f'vk_process function error: {error}')
+            print(f'vk_process snapshot error: {error}')
+
+    def apply(self, deltas: list[VkFeedDelta]):
+        version = self.feed.apply(deltas)
+
+        if self.publish is not None:
+            self.publish((version, deltas))
+
+        if self.shared_feed is not None:
+            self.shared_feed.write(version, self.feed.items())
+
+        self.snapshot_changed = True
+
+    def force_update(self):
+        self.force_update_event.set()
+
+    async def step(self, wait_time: int):
+        if self.commands is not None and not self.commands.empty():
+            if 'force_update' in self.commands.get():
+                self.force_update()
+
+        if self.shared_feed is not None and self.shared_feed.is_update_requested():
+            self.force_update()
+
+        if self.long_poll_data is None:
+            self.long_poll_data = await self.get_long_poll_data()
+
+        if not self.loaded or self.force_update_event.is_set():
+            self.force_update_event.clear()
+            await self.refresh(full=True)
+            self.loaded, self.reconcile = True, False
+        elif self.reconcile:
+            await self.refresh(full=False)
+            self.reconcile = False
+
+        if self.settings.VK_PROCESS_DEBUG:
+            deltas = await print_time_log('vk_process', self.get_long_poll_changes, wait_time)
+        else:
+            deltas = await self.get_long_poll_changes(wait_time)
+
+        if deltas == 'update_long_poll_data':
+            self.long_poll_data = await self.get_long_poll_data()
+        elif deltas:
+            if self.settings.VK_PROCESS_DEBUG:
+                print(deltas)
+            print(f'sending data: {len(deltas)} changes')
+            self.apply(deltas)
+
+        if self.snapshot_changed and self.settings.VK_SNAPSHOT_PATH:
+            await self.save_feed_snapshot()
+
+    async def run(self):
+        print('vk_process started')
+
+        wait_time = int(os.getenv('VK_WAIT', 20))
+        connector = aiohttp.TCPConnector(limit=self.settings.VK_HTTP_POOL_SIZE, keepalive_timeout=wait_time * 3)
+        timeout = aiohttp.ClientTimeout(total=wait_time + self.settings.VK_HTTP_TIMEOUT)
+
+        if self.settings.VK_SNAPSHOT_PATH:
+            self.load_feed_snapshot()
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as self.session:
+            while True:
+                try:
+                    await self.step(wait_time)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as error:
+                    print(f'vk_process function error: {error}')
+                    await asyncio.sleep(self.settings.VK_ERROR_DELAY)
+
+
+def vk_process(connection_send: Queue, connection_get: Queue, shared_memory_name: str | None = None):
+    feed = VkFeed(get_settings().VK_FEED_SIZE)
+
+    if shared_memory_name is None:
+        asyncio.run(VkPoller(feed, connection_send.put, connection_get).run())
+        return
+
+    shared_feed = SharedFeed(shared_memory_name)
+    try:
+        asyncio.run(VkPoller(feed, shared_feed=shared_feed).run())
+    finally:
+        shared_feed.close()
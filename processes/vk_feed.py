@@ -0,0 +1,115 @@
+import time
+from typing import NamedTuple, Iterator
+
+VK_FEED_ADD = 'add'
+VK_FEED_EDIT = 'edit'
+VK_FEED_DELETE = 'delete'
+VK_FEED_RESET = 'reset'
+
+
+class VkNewsRecord(NamedTuple):
+    post_id: int
+    title: str | None
+    content: str | None
+    image_url: str | None
+    link: str
+
+
+# ('add' | 'edit', VkNewsRecord), ('delete', post_id) or ('reset', [VkNewsRecord, ...]) newest first
+VkFeedDelta = tuple[str, VkNewsRecord | int | list[VkNewsRecord]]
+
+
+class VkFeedError(Exception): ...
+
+
+class VkFeed:
+    __slots__ = ('capacity', 'records', 'head', 'count', 'slots', 'version')
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.records: list[VkNewsRecord | None] = [None] * capacity
+        self.head = 0
+        self.count = 0
+        self.slots: dict[int, int] = {}
+        # milliseconds at start, so a restarted producer never reuses an old version
+        self.version = time.time_ns() // 1_000_000
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[VkNewsRecord]:
+        for index in range(self.count):
+            yield self.records[(self.head + index) % self.capacity]
+
+    def __contains__(self, post_id: int) -> bool:
+        return post_id in self.slots
+
+    def items(self) -> list[VkNewsRecord]:
+        return list(self)
+
+    def newest_post_id(self) -> int | None:
+        # not the head, a pinned post stays on top of the wall
+        return max(self.slots, default=None)
+
+    def add(self, record: VkNewsRecord) -> None:
+        if record.post_id in self.slots:
+            return self.edit(record)
+
+        self.head = (self.head - 1) % self.capacity
+        if self.count == self.capacity:
+            del self.slots[self.records[self.head].post_id]
+        else:
+            self.count += 1
+
+        self.records[self.head] = record
+        self.slots[record.post_id] = self.head
+
+    def edit(self, record: VkNewsRecord) -> None:
+        if record.post_id not in self.slots:
+            return
+
+        self.records[self.slots[record.post_id]] = record
+
+    def delete(self, post_id: int) -> None:
+        if post_id not in self.slots:
+            return
+
+        self.reset([record for record in self if record.post_id != post_id])
+
+    def reset(self, records: list[VkNewsRecord]) -> None:
+        records = records[:self.capacity]
+
+        self.records = records + [None] * (self.capacity - len(records))
+        self.head = 0
+        self.count = len(records)
+        self.slots = {record.post_id: index for index, record in enumerate(records)}
+
+    def diff(self, records: list[VkNewsRecord]) -> list[VkFeedDelta]:
+        post_ids = {record.post_id for record in records}
+        deltas: list[VkFeedDelta] = [
+            (VK_FEED_DELETE, record.post_id) for record in self if record.post_id not in post_ids
+        ]
+
+        for record in reversed(records):
+            if record.post_id not in self.slots:
+                deltas.append((VK_FEED_ADD, record))
+            elif self.records[self.slots[record.post_id]] != record:
+                deltas.append((VK_FEED_EDIT, record))
+
+        return deltas
+
+    def apply(self, deltas: list[VkFeedDelta], version: int | None = None) -> int:
+        for action, value in deltas:
+            if action == VK_FEED_ADD:
+                self.add(value)
+            elif action == VK_FEED_EDIT:
+                self.edit(value)
+            elif action == VK_FEED_DELETE:
+                self.delete(value)
+            elif action == VK_FEED_RESET:
+                self.reset(value)
+            else:
+                raise VkFeedError(f'unknown feed action: {action}')
+
+        self.version = self.version + 1 if version is None else version
+        return self.version
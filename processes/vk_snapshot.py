@@ -0,0 +1,37 @@
+import json
+import os
+
+from processes.vk_feed import VkFeed, VkNewsRecord
+
+
+class VkSnapshotError(Exception): ...
+
+
+def get_snapshot(feed: VkFeed, long_poll_data: dict | None) -> dict:
+    return {
+        'version': feed.version,
+        'long_poll': dict(long_poll_data) if long_poll_data is not None else None,
+        'items': [list(record) for record in feed],
+    }
+
+
+def save_snapshot(path: str, snapshot: dict) -> None:
+    if directory := os.path.dirname(path):
+        os.makedirs(directory, exist_ok=True)
+
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as snapshot_file:
+        json.dump(snapshot, snapshot_file, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def load_snapshot(path: str) -> tuple[list[VkNewsRecord], dict | None] | None:
+    try:
+        with open(path, encoding='utf-8') as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as error:
+        raise VkSnapshotError(f'broken vk snapshot {path}: {error}')
+
+    return [VkNewsRecord(*item) for item in snapshot['items']], snapshot.get('long_poll')
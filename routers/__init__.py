@@ -1,4 +1,5 @@
 from routers.news import router as news_router
 from routers.code import router as code_router
+from routers.metrics import router as metrics_router
 
-__all__ = (news_router, code_router, )
+__all__ = (news_router, code_router, metrics_router, )
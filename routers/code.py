@@ -1,21 +1,32 @@
-import base64
+import json
 import os
+from typing import NamedTuple, AsyncIterator
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Body
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Body, Query, Request
 from pydantic import BaseModel
+from sqlalchemy import update, delete, select, func, literal_column, union_all
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from starlette.responses import FileResponse
+from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
 
 from config import get_settings
+from controllers.cache_controller import LRUCache
+from controllers.file_responses import file_response, make_etag, is_not_modified, IMMUTABLE_CACHE_CONTROL, \
+    read_file_base64_json, get_base64_json_size
 from controllers.files_controller import FileController
-from controllers.saving_files import save_file
+from controllers.images_controller import get_image_variant, remove_image_variants, get_media_type, \
+    VARIANT_FORMATS
+from controllers.saving_files import save_file, hash_file, remove_file
 from controllers.user_controller import current_active_user
-from db import get_async_session, CodeFile, User, CodeCharacter, CodeFraction, CodeLocation, CodeItem, CodeDifferent, \
-    Base, CodeFileClass
-from routers.schemas import CodeCharacterRead, CodeCharacterPatch, CodeFractionRead, CodeFractionPatch, \
-    CodeLocationRead, CodeLocationPatch, CodeItemRead, CodeItemPatch, CodeDifferentRead, CodeDifferentPatch, \
-    BaseModelsPostWithFile, CodeDifferentGet, CodeItemGet, CodeLocationGet, CodeFractionGet
+from db import get_async_session, get_async_read_session, CodeFile, User, CodeCharacter, CodeFraction, \
+    CodeLocation, CodeItem, CodeDifferent, Base, CodeFileClass, SEARCH_CONFIG
+from routers.schemas import CodeCharacterRead, CodeCharacterGet, CodeCharacterPatch, CodeFractionRead, \
+    CodeFractionPatch, CodeLocationRead, CodeLocationPatch, CodeItemRead, CodeItemPatch, CodeDifferentRead, \
+    CodeDifferentPatch, BaseModelsPostWithFile, CodeDifferentGet, CodeItemGet, CodeLocationGet, CodeFractionGet, \
+    CodePage, CodeSearchPage, CodeBatchItem, CodeBatchRead, CodeFileRead
 
 router = APIRouter(
     prefix="/code",
@@ -25,7 +36,7 @@ router = APIRouter(
 sql_classes = {
     CodeCharacter: {
         'get': CodeCharacterRead,
-        'post': CodeCharacterRead,
+        'post': CodeCharacterGet,
         'patch': CodeCharacterPatch,
     },
 
@@ -54,41 +65,145 @@ sql_classes = {
     }
 }
 
+sql_classes_by_name = {sql_class.__name__: sql_class for sql_class in sql_classes}
+
+
+class CodeFileInfo(NamedTuple):
+    id: int
+    file_path: str
+    file_format: str
+    content_hash: str | None
+
+
+code_files_cache = LRUCache(get_settings().CODE_FILE_CACHE_SIZE, ttl=get_settings().CODE_FILE_CACHE_TTL)
+code_objects_cache = LRUCache(get_settings().CODE_CACHE_SIZE, ttl=get_settings().CODE_CACHE_TTL)
+base64_cache = LRUCache(get_settings().BASE64_CACHE_SIZE * 1024 * 1024, get_size=len,
+                        ttl=get_settings().CODE_FILE_CACHE_TTL)
+# cached for deleted objects, a lagging replica can still return them for a while
+DELETED_OBJECT = b'null'
+
+
+async def get_code_file_info(file_id: int, session: AsyncSession) -> CodeFileInfo | None:
+    if (code_file := code_files_cache.get(file_id)) is not None:
+        return code_file
+
+    image: CodeFile | None = await session.get(CodeFile, file_id)
+    if image is None:
+        return None
+
+    code_file = CodeFileInfo(image.id, image.file_path, image.file_format, image.content_hash)
+    code_files_cache.set(file_id, code_file)
+    return code_file
+
 
 def get_function(sql_class: CodeFileClass, response_scheme: BaseModel) -> None:
     @router.get(f'/{sql_class.__name__}/' + '{object_id}', response_model=response_scheme)
-    async def function(object_id: int, session: AsyncSession = Depends(get_async_session)):
+    async def function(object_id: int, session: AsyncSession = Depends(get_async_read_session)):
+        if (content := code_objects_cache.get((sql_class.__name__, object_id))) is not None:
+            if content == DELETED_OBJECT:
+                raise HTTPException(404, detail='data not found')
+            return Response(content, media_type='application/json')
+
         data: sql_class | None = await session.get(sql_class, object_id, options=(selectinload(sql_class.code_file), ))
 
         if data is None:
             raise HTTPException(404, detail='data not found')
 
-        return response_scheme.from_orm(data)
+        content = response_scheme.from_orm(data).json().encode()
+        code_objects_cache.set((sql_class.__name__, object_id), content)
+        return Response(content, media_type='application/json')
 
 
-async def saving_file(_file: UploadFile, session: AsyncSession):
-    settings = get_settings()
-    filepath = settings.CODE_IMAGE_CONTROLLER.get_filename()
+def list_function(sql_class: CodeFileClass, response_scheme: BaseModel) -> None:
+    page_scheme = CodePage[response_scheme]
+
+    @router.get(f'/{sql_class.__name__}/', response_model=page_scheme)
+    async def function(cursor: int = Query(default=0, ge=0),
+                       limit: int = Query(default=get_settings().CODE_PAGE_SIZE, ge=1,
+                                          le=get_settings().CODE_PAGE_MAX_SIZE),
+                       session: AsyncSession = Depends(get_async_read_session)):
+        statement = select(sql_class).options(joinedload(sql_class.code_file)) \
+            .where(sql_class.id > cursor) \
+            .order_by(sql_class.id) \
+            .limit(limit + 1)
+
+        data: list[sql_class] = (await session.execute(statement)).scalars().all()
+
+        return page_scheme(
+            items=[response_scheme.from_orm(item) for item in data[:limit]],
+            next_cursor=data[limit - 1].id if len(data) > limit else None
+        )
+
+
+async def reference_code_file(content_hash: str, session: AsyncSession) -> CodeFile | None:
+    statement = update(CodeFile).where(CodeFile.content_hash == content_hash) \
+        .values(references=CodeFile.references + 1) \
+        .returning(CodeFile.id) \
+        .execution_options(synchronize_session=False)
+
+    code_file_id = (await session.execute(statement)).scalar()
+    if code_file_id is None:
+        return None
+
+    # committed by the caller together with the object holding the reference
+    return await session.get(CodeFile, code_file_id, populate_existing=True)
+
+
+async def release_code_file(code_file_id: int | None, session: AsyncSession) -> None:
+    if code_file_id is None:
+        return
+
+    statement = update(CodeFile).where(CodeFile.id == code_file_id) \
+        .values(references=CodeFile.references - 1) \
+        .returning(CodeFile.references, CodeFile.file_path) \
+        .execution_options(synchronize_session=False)
+
+    code_file = (await session.execute(statement)).first()
+    if code_file is None:
+        return
+
+    removed = False
+    if code_file.references <= 0:
+        statement = delete(CodeFile).where(CodeFile.id == code_file_id, CodeFile.references <= 0) \
+            .execution_options(synchronize_session=False)
+        removed = bool((await session.execute(statement)).rowcount)
 
-    try:
-        with open(filepath, 'wb') as to_save_file:
-            counter = 0
-            while content := await _file.read(1024 * 1024):
-                counter += 1
-                if counter > settings.MAX_FILE_SIZE:
-                    to_save_file.close()
-                    os.remove(filepath)
-                    raise HTTPException(400, detail=f'file size more than {settings.MAX_FILE_SIZE} Mb')
-                to_save_file.write(content)
-
-    except Exception as error:
-        os.remove(filepath)
-        raise HTTPException(500, detail=f'saving image error: {error}')
-
-    _file = CodeFile(file_format=settings.CODE_IMAGE_CONTROLLER.file_format, file_path=filepath)
-    session.add(_file)
     await session.commit()
-    await session.refresh(_file)
+
+    if removed:
+        code_files_cache.pop(code_file_id)
+        base64_cache.pop(code_file_id)
+        await remove_file(code_file.file_path)
+        await remove_image_variants(code_file.file_path)
+
+
+async def saving_file(_file: UploadFile, session: AsyncSession) -> CodeFile:
+    content_hash = await hash_file(_file)
+
+    if (code_file := await reference_code_file(content_hash, session)) is not None:
+        return code_file
+
+    file_controller: FileController = get_settings().CODE_IMAGE_CONTROLLER
+    saved_file = await save_file(_file, file_controller)
+
+    _file = CodeFile(
+        file_format=file_controller.file_format,
+        file_path=saved_file.file_path,
+        content_hash=saved_file.content_hash
+    )
+
+    try:
+        # a savepoint, the conflict does not roll back the rest of the request
+        async with session.begin_nested():
+            session.add(_file)
+    except IntegrityError:
+        # the same image was stored by a concurrent upload
+        await remove_file(saved_file.file_path)
+
+        if (code_file := await reference_code_file(content_hash, session)) is None:
+            raise HTTPException(500, detail='saving image error: file hash conflict')
+        return code_file
+
     return _file
 
 
@@ -110,7 +225,11 @@ def post_function(sql_class: Base, get_scheme: BaseModelsPostWithFile, response_
         session.add(data_model)
         await session.commit()
         await session.refresh(data_model)
-        return response_scheme.from_orm(data_model)
+
+        # the primary has the fresh object, reads from a lagging replica must not replace it
+        content = response_scheme.from_orm(data_model).json().encode()
+        code_objects_cache.set((sql_class.__name__, data_model.id), content)
+        return Response(content, media_type='application/json')
 
 
 # Шашлички из курицы и еживичный твист
@@ -128,8 +247,9 @@ def patch_function(sql_class: CodeFileClass, get_scheme: BaseModelsPostWithFile,
         if data is None:
             raise HTTPException(404, detail=f'{sql_class.__name__} {object_id} not found')
 
+        replaced_file_id = None
         if file is not None:
-            data.code_file_id = (await saving_file(file, session)).id
+            replaced_file_id, data.code_file_id = data.code_file_id, (await saving_file(file, session)).id
 
         if post_data is not None:
             for key in post_data.dict():
@@ -137,10 +257,13 @@ def patch_function(sql_class: CodeFileClass, get_scheme: BaseModelsPostWithFile,
 
         session.add(data)
         await session.commit()
+        await release_code_file(replaced_file_id, session)
         await session.refresh(data)
 
         data.code_file = await session.get(CodeFile, data.code_file_id)
-        return response_scheme.from_orm(data)
+        content = response_scheme.from_orm(data).json().encode()
+        code_objects_cache.set((sql_class.__name__, object_id), content)
+        return Response(content, media_type='application/json')
 
 
 def delete_function(sql_class: CodeFileClass) -> None:
@@ -155,60 +278,202 @@ def delete_function(sql_class: CodeFileClass) -> None:
         if data is None:
             raise HTTPException(404, detail='data not found')
 
-        if os.path.isfile(data.code_file.file_path):
-            os.remove(data.code_file.file_path)
+        code_file_id = data.code_file_id
 
-        await session.delete(data.code_file)
         await session.delete(data)
+        await session.commit()
+        code_objects_cache.set((sql_class.__name__, object_id), DELETED_OBJECT)
+
+        await release_code_file(code_file_id, session)
 
 
 @router.get('/files/{file_id}')
-async def get_file_by_id(file_id: int, session: AsyncSession = Depends(get_async_session)):
-    image: CodeFile | None = await session.get(CodeFile, file_id)
+async def get_file_by_id(request: Request, file_id: int,
+                         w: int | None = Query(default=None, ge=1, le=get_settings().IMAGE_MAX_VARIANT_SIZE),
+                         h: int | None = Query(default=None, ge=1, le=get_settings().IMAGE_MAX_VARIANT_SIZE),
+                         file_format: str | None = Query(default=None, alias='format',
+                                                         regex=f'^({"|".join(VARIANT_FORMATS)})$'),
+                         session: AsyncSession = Depends(get_async_read_session)):
+    image = await get_code_file_info(file_id, session)
 
     if image is None:
         raise HTTPException(404, detail=f'no image {file_id} found')
 
-    if not os.path.isfile(image.file_path):
+    file_format = file_format or image.file_format
+    is_original = w is None and h is None and file_format == image.file_format
+
+    etag = None
+    if image.content_hash is not None:
+        etag = make_etag(image.content_hash)
+        if not is_original:
+            etag = make_etag(image.content_hash, w or 0, h or 0, file_format)
+
+        if is_not_modified(request.headers, etag):
+            return Response(status_code=304, headers={'etag': etag, 'cache-control': IMMUTABLE_CACHE_CONTROL})
+
+    if is_original:
+        file_path = image.file_path
+    elif os.path.isfile(image.file_path):
+        file_path = await get_image_variant(image.file_path, w, h, file_format)
+    else:
         raise HTTPException(404, detail=f'server founded news file in db but miss {image.file_path}')
 
-    return FileResponse(image.file_path)
+    return await file_response(request.headers, file_path, get_media_type(file_format), etag=etag)
+
+
+async def caching_base64(file_id: int, content: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    chunks = []
+    async for chunk in content:
+        chunks.append(chunk)
+        yield chunk
+
+    base64_cache.set(file_id, b''.join(chunks))
 
 
 @router.get('/files/base64/{file_id}')
-async def get_file_by_id_base64(file_id: int, session: AsyncSession = Depends(get_async_session)):
-    image: CodeFile | None = await session.get(CodeFile, file_id)
+async def get_file_by_id_base64(request: Request, file_id: int,
+                                session: AsyncSession = Depends(get_async_read_session)):
+    image = await get_code_file_info(file_id, session)
 
     if image is None:
         raise HTTPException(404, detail=f'server miss news {file_id} files')
 
+    headers = {'cache-control': IMMUTABLE_CACHE_CONTROL}
+    if image.content_hash is not None:
+        headers['etag'] = make_etag(image.content_hash, 'base64')
+        if is_not_modified(request.headers, headers['etag']):
+            return Response(status_code=304, headers=headers)
+
+    if (content := base64_cache.get(file_id)) is not None:
+        return Response(content, media_type='application/json', headers=headers)
+
     try:
-        with open(image.file_path, 'rb') as file_content:
-            content: str = base64.b64encode(file_content.read())
+        size = (await run_in_threadpool(os.stat, image.file_path)).st_size
     except FileNotFoundError:
         raise HTTPException(500, detail=f'server founded news file in db but miss {image.file_path}')
 
-    return content
+    headers['content-length'] = str(get_base64_json_size(size))
 
+    content = read_file_base64_json(image.file_path)
+    if get_base64_json_size(size) <= get_settings().BASE64_CACHE_ITEM_SIZE * 1024 * 1024:
+        content = caching_base64(file_id, content)
 
-@router.post('/files/', status_code=203)
+    return StreamingResponse(content, media_type='application/json', headers=headers)
+
+
+@router.post('/files/', status_code=203, response_model=CodeFileRead)
 async def post_image(file: UploadFile = File(...),
                      session: AsyncSession = Depends(get_async_session),
                      current_user: User = Depends(current_active_user)):
     if not current_user.is_superuser:
         raise HTTPException(403, detail=f'user {current_user.id} is not a superuser')
 
-    file_controller: FileController = get_settings().CODE_IMAGE_CONTROLLER
-    code_file = CodeFile(file_path=await save_file(file, file_controller.get_filename()),
-                         file_format=file_controller.file_format)
-
-    session.add(code_file)
+    # the uploader holds the reference, the id is returned so the file can be used
+    code_file = await saving_file(file, session)
     await session.commit()
     await session.refresh(code_file)
+    return CodeFileRead.from_orm(code_file)
+
+
+def get_search_statement(sql_class: CodeFileClass, query):
+    title = sql_class.first_name + ' ' + sql_class.second_name if sql_class is CodeCharacter else sql_class.name
+
+    return select(
+        literal_column(f"'{sql_class.__name__}'").label('type'),
+        sql_class.id.label('id'),
+        title.label('title'),
+        sql_class.description.label('description'),
+        sql_class.code_file_id.label('code_file_id'),
+        func.ts_rank(sql_class.search_vector, query).label('rank')
+    ).where(sql_class.search_vector.op('@@')(query))
+
+
+@router.get('/search', response_model=CodeSearchPage)
+async def search(q: str = Query(min_length=1, max_length=256),
+                 offset: int = Query(default=0, ge=0),
+                 limit: int = Query(default=get_settings().CODE_PAGE_SIZE, ge=1, le=get_settings().CODE_PAGE_MAX_SIZE),
+                 session: AsyncSession = Depends(get_async_read_session)):
+    query = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), q)
+    hits = union_all(*(get_search_statement(sql_class, query) for sql_class in sql_classes)).subquery()
+
+    statement = select(hits) \
+        .order_by(hits.c.rank.desc(), hits.c.type, hits.c.id) \
+        .offset(offset) \
+        .limit(limit + 1)
+
+    data = (await session.execute(statement)).all()
+
+    return CodeSearchPage(
+        items=[dict(row._mapping) for row in data[:limit]],
+        next_offset=offset + limit if len(data) > limit else None
+    )
+
+
+async def load_code_objects(ids: dict[CodeFileClass, set[int]], session: AsyncSession) -> list[CodeFileClass]:
+    objects = []
+    for sql_class, object_ids in ids.items():
+        objects += (await session.execute(select(sql_class).where(sql_class.id.in_(object_ids)))).scalars().all()
+
+    # one query for the files of every object instead of a lazy load each
+    code_file_ids = {item.code_file_id for item in objects if item.code_file_id is not None}
+    code_files = {}
+    if code_file_ids:
+        statement = select(CodeFile).where(CodeFile.id.in_(code_file_ids))
+        code_files = {code_file.id: code_file for code_file in (await session.execute(statement)).scalars()}
+
+    for item in objects:
+        set_committed_value(item, 'code_file', code_files.get(item.code_file_id))
+
+    return objects
+
+
+@router.post('/batch', response_model=list[CodeBatchRead])
+async def get_batch(items: list[CodeBatchItem] = Body(max_items=get_settings().CODE_PAGE_MAX_SIZE),
+                    session: AsyncSession = Depends(get_async_read_session)):
+    contents: dict[tuple[str, int], bytes | None] = {}
+    missing: dict[CodeFileClass, set[int]] = {}
+
+    for item in items:
+        if (sql_class := sql_classes_by_name.get(item.type)) is None:
+            raise HTTPException(400, detail=f'unknown type {item.type}')
+
+        key = (item.type, item.id)
+        if key in contents:
+            continue
+
+        contents[key] = code_objects_cache.get(key)
+        if contents[key] is None:
+            missing.setdefault(sql_class, set()).add(item.id)
+
+    for data in await load_code_objects(missing, session):
+        key = (type(data).__name__, data.id)
+        contents[key] = sql_classes[type(data)]['get'].from_orm(data).json().encode()
+        code_objects_cache.set(key, contents[key])
+
+    # cached objects are already json, they are joined as they are, deleted ones are already null
+    content = b','.join(
+        f'{{"type": {json.dumps(item.type)}, "id": {item.id}, "data": '.encode()
+        + (contents[(item.type, item.id)] or DELETED_OBJECT) + b'}'
+        for item in items
+    )
+    return Response(b'[' + content + b']', media_type='application/json')
+
+
+@router.get('/cache/stats')
+async def get_cache_stats(current_user: User = Depends(current_active_user)):
+    if not current_user.is_superuser:
+        raise HTTPException(403, detail='Access Denied')
+
+    return {
+        'objects': code_objects_cache.stats(),
+        'files': code_files_cache.stats(),
+        'base64': base64_cache.stats(),
+    }
 
 
 for sql_class in sql_classes:
     get_function(sql_class, sql_classes[sql_class]['get'])
+    list_function(sql_class, sql_classes[sql_class]['get'])
     post_function(sql_class, sql_classes[sql_class]['post'], sql_classes[sql_class]['get'])
     patch_function(sql_class, sql_classes[sql_class]['patch'], sql_classes[sql_class]['get'])
     delete_function(sql_class)
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from controllers.user_controller import current_active_user
+from db import User
+from db.engine import SessionManager
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+
+@router.get('/db')
+async def get_db_metrics(current_user: User = Depends(current_active_user)):
+    if not current_user.is_superuser:
+        raise HTTPException(403, detail='Access Denied')
+
+    session_manager = SessionManager()
+    return {
+        'primary': session_manager.get_pool_status(),
+        'replicas': session_manager.get_replicas_status(),
+    }
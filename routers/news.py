@@ -1,9 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+import gzip
+from typing import NamedTuple
 
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from starlette.responses import Response, StreamingResponse
+
+from controllers.cache_controller import LRUCache
+from controllers.file_responses import make_etag, is_not_modified, accepts_encoding
 from controllers.user_controller import current_active_user
 from db import User
 from processes.processes_manager import get_processes_manager
-from routers.schemas import VkNewsReadList
+from processes.vk_feed import VkFeed
+from routers.schemas import VkNewsReadList, VkNewsRead
 
 router = APIRouter(
     prefix="/news",
@@ -13,12 +20,54 @@ router = APIRouter(
 process_manager = get_processes_manager()
 
 
+class RenderedFeed(NamedTuple):
+    etag: str
+    body: bytes
+    gzip_body: bytes
+
+
+rendered_feeds = LRUCache(2)
+
+
+def get_rendered_feed(feed: VkFeed) -> RenderedFeed:
+    if (rendered_feed := rendered_feeds.get(feed.version)) is not None:
+        return rendered_feed
+
+    items = [VkNewsRead.from_orm(record) for record in feed]
+    body = VkNewsReadList(count=len(items), items=items).json().encode()
+
+    rendered_feed = RenderedFeed(make_etag('vk', feed.version), body, gzip.compress(body))
+    rendered_feeds.set(feed.version, rendered_feed)
+    return rendered_feed
+
+
 @router.get('/from_vk', response_model=VkNewsReadList)
-async def get_news_from_vk():
+async def get_news_from_vk(request: Request):
     process_manager.update_vk_data()
-    data = process_manager.VK_DATA
+    rendered_feed = get_rendered_feed(process_manager.vk_feed)
+
+    headers = {'etag': rendered_feed.etag, 'vary': 'Accept-Encoding', 'cache-control': 'no-cache'}
+    if is_not_modified(request.headers, rendered_feed.etag):
+        return Response(status_code=304, headers=headers)
+
+    if accepts_encoding(request.headers, 'gzip'):
+        headers['content-encoding'] = 'gzip'
+        return Response(rendered_feed.gzip_body, media_type='application/json', headers=headers)
+
+    return Response(rendered_feed.body, media_type='application/json', headers=headers)
 
-    return VkNewsReadList(count=len(data), items=data)
+
+@router.get('/from_vk/stream')
+async def stream_news_from_vk(request: Request, last_event_id: int | None = Query(default=None)):
+    if last_event_id is None and (header := request.headers.get('last-event-id', '')).isdigit():
+        last_event_id = int(header)
+
+    process_manager.update_vk_data()
+    return StreamingResponse(
+        process_manager.vk_broadcaster.subscribe(last_event_id, process_manager.get_vk_snapshot),
+        media_type='text/event-stream',
+        headers={'cache-control': 'no-cache', 'x-accel-buffering': 'no'}
+    )
 
 
 @router.post('/from_vk/forced_reload', status_code=200)
@@ -2,11 +2,14 @@ import datetime
 import json
 import uuid
 from string import ascii_letters, digits
-from typing import List, Optional
+from typing import List, Optional, Generic, TypeVar
 
 from fastapi_users import schemas
 from fastapi_users.schemas import CreateUpdateDictModel
 from pydantic import EmailStr, validator, BaseModel
+from pydantic.generics import GenericModel
+
+T = TypeVar('T')
 
 
 class BaseModelsPostWithFile(BaseModel):
@@ -21,6 +24,37 @@ class BaseModelsPostWithFile(BaseModel):
         return value
 
 
+class CodePage(GenericModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[int]
+
+
+class CodeSearchRead(BaseModel):
+    type: str
+    id: int
+    title: str
+    description: Optional[str]
+    code_file_id: Optional[int]
+    rank: float
+
+    class Config:
+        orm_mode = True
+
+
+class CodeSearchPage(BaseModel):
+    items: List[CodeSearchRead]
+    next_offset: Optional[int]
+
+
+class CodeBatchItem(BaseModel):
+    type: str
+    id: int
+
+
+class CodeBatchRead(CodeBatchItem):
+    data: Optional[dict]
+
+
 class UserRead(schemas.BaseUser[uuid.UUID]):
     username: str
 
@@ -138,25 +172,35 @@ class NewsPostScheme(BaseModel):
     context: str
 
 
-class CodeCharacterRead(BaseModel):
-    first_name: str
-    second_name: str
+class CodeFileRead(BaseModel):
+    id: int
 
-    description: str
+    file_format: str
 
     class Config:
         orm_mode = True
 
 
-class CodeFileRead(BaseModel):
+class CodeCharacterRead(BaseModel):
     id: int
+    first_name: str
+    second_name: str
 
-    file_format: str
+    description: str
+
+    code_file: Optional[CodeFileRead]
 
     class Config:
         orm_mode = True
 
 
+class CodeCharacterGet(BaseModelsPostWithFile):
+    first_name: str
+    second_name: str
+
+    description: str
+
+
 class CodeCharacterPatch(BaseModel):
     first_name: Optional[str]
     second_name: Optional[str]
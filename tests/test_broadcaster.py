@@ -0,0 +1,31 @@
+from processes.broadcaster import Broadcaster
+
+
+def get_snapshot() -> tuple[int, bytes]:
+    return 9, b'reset 9'
+
+
+def get_broadcaster() -> Broadcaster:
+    broadcaster = Broadcaster(history_size=3)
+    # a worker syncing the shared snapshot sees versions 3, 5, 7 and 9 only
+    for version in (3, 5, 7, 9):
+        broadcaster.publish(version, f'diff to {version}'.encode())
+    return broadcaster
+
+
+def test_replay_from_a_published_version():
+    assert get_broadcaster().get_replay(5, get_snapshot) == [b'diff to 7', b'diff to 9']
+
+
+def test_replay_from_the_current_version_is_empty():
+    assert get_broadcaster().get_replay(9, get_snapshot) == []
+
+
+def test_unseen_version_in_history_range_gets_the_snapshot():
+    # version 6 was published by another worker, the diff to 7 here starts from 5
+    assert get_broadcaster().get_replay(6, get_snapshot) == [b'reset 9']
+
+
+def test_evicted_or_missing_version_gets_the_snapshot():
+    assert get_broadcaster().get_replay(3, get_snapshot) == [b'reset 9']
+    assert get_broadcaster().get_replay(None, get_snapshot) == [b'reset 9']
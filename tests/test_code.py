@@ -0,0 +1,83 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import DBAPIError
+
+from config import get_settings
+from controllers.files_controller import FileController
+from db import User, CodeFile
+from db.engine import SessionManager, get_async_read_session
+from routers.code import release_code_file
+from test_db import is_database_available, create_test_application
+
+
+async def get_lagging_read_session():
+    # every read must be served by the cache, a session would be the replica
+    yield None
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    from controllers.user_controller import current_active_user
+
+    monkeypatch.setattr(get_settings(), 'CODE_IMAGE_CONTROLLER', FileController(str(tmp_path)))
+
+    application = create_test_application()
+    application.dependency_overrides[current_active_user] = lambda: User(id=1, is_superuser=True)
+
+    with TestClient(application) as client:
+        yield client
+
+
+@pytest.mark.skipif(not is_database_available(), reason='postgres is not available')
+def test_writes_cache_the_primary_state(client):
+    response = client.post('/code/CodeItem', files={'file': ('item.jpg', b'item image', 'image/jpeg')},
+                           data={'post_data': json.dumps({'name': 'sword', 'description': 'sharp'})})
+    assert response.status_code == 200
+    object_id = response.json()['id']
+
+    client.app.dependency_overrides[get_async_read_session] = get_lagging_read_session
+
+    assert client.get(f'/code/CodeItem/{object_id}').json()['name'] == 'sword'
+
+    response = client.patch(f'/codeCodeItem{object_id}',
+                            data={'post_data': json.dumps({'name': 'axe', 'description': 'heavy'})})
+    assert response.status_code == 200
+    assert client.get(f'/code/CodeItem/{object_id}').json()['name'] == 'axe'
+
+    assert client.delete(f'/code/CodeItem/{object_id}').status_code == 203
+    assert client.get(f'/code/CodeItem/{object_id}').status_code == 404
+    assert client.post('/code/batch', json=[{'type': 'CodeItem', 'id': object_id}]).json()[0]['data'] is None
+
+
+def get_references(client: TestClient, file_id: int) -> int | None:
+    async def query() -> int | None:
+        async with SessionManager().get_session() as session:
+            code_file = await session.get(CodeFile, file_id)
+            return code_file and code_file.references
+
+    return client.portal.call(query)
+
+
+@pytest.mark.skipif(not is_database_available(), reason='postgres is not available')
+def test_failed_owner_keeps_references(client):
+    image = ('item.jpg', b'shared item image', 'image/jpeg')
+
+    file_id = client.post('/code/files/', files={'file': image}).json()['id']
+    assert client.post('/code/files/', files={'file': image}).json()['id'] == file_id
+    assert get_references(client, file_id) == 2
+
+    # longer than the name column, the insert fails after the reference was taken
+    with pytest.raises(DBAPIError):
+        client.post('/code/CodeItem', files={'file': image},
+                    data={'post_data': json.dumps({'name': 'sword' * 13, 'description': 'sharp'})})
+    assert get_references(client, file_id) == 2
+
+    async def release() -> None:
+        async with SessionManager().get_session() as session:
+            for _ in range(2):
+                await release_code_file(file_id, session)
+
+    client.portal.call(release)
+    assert get_references(client, file_id) is None
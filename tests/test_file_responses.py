@@ -0,0 +1,92 @@
+from email.utils import formatdate
+
+import pytest
+from fastapi import HTTPException
+
+from controllers.file_responses import parse_range, is_not_modified, accepts_encoding, make_etag
+
+ETAG = make_etag('abc')
+MODIFIED_TIME = 1_700_000_000.5
+
+
+@pytest.mark.parametrize('byte_range, expected', (
+    ('bytes=0-99', (0, 99)),
+    ('bytes=900-', (900, 999)),
+    ('bytes=-100', (900, 999)),
+    ('bytes=-5000', (0, 999)),
+    ('bytes=500-5000', (500, 999)),
+))
+def test_parse_range(byte_range, expected):
+    assert parse_range({'range': byte_range}, 1000, ETAG) == expected
+
+
+@pytest.mark.parametrize('headers', (
+    {},
+    {'range': 'items=0-10'},
+    {'range': 'bytes=0-10,20-30'},
+    {'range': 'bytes=a-b'},
+    {'range': 'bytes=0-10', 'if-range': make_etag('old')},
+))
+def test_parse_range_sends_the_whole_file(headers):
+    assert parse_range(headers, 1000, ETAG) is None
+
+
+def test_parse_range_with_a_matching_if_range():
+    assert parse_range({'range': 'bytes=0-10', 'if-range': ETAG}, 1000, ETAG) == (0, 10)
+
+
+@pytest.mark.parametrize('byte_range', ('bytes=1000-', 'bytes=1500-2000', 'bytes=20-10'))
+def test_parse_range_unsatisfiable(byte_range):
+    with pytest.raises(HTTPException) as error:
+        parse_range({'range': byte_range}, 1000, ETAG)
+
+    assert error.value.status_code == 416
+    assert error.value.headers == {'content-range': 'bytes */1000'}
+
+
+@pytest.mark.parametrize('if_none_match, expected', (
+    (ETAG, True),
+    (f'W/{ETAG}', True),
+    (f'{make_etag("old")}, {ETAG}', True),
+    ('*', True),
+    (make_etag('old'), False),
+))
+def test_is_not_modified_by_etag(if_none_match, expected):
+    assert is_not_modified({'if-none-match': if_none_match}, ETAG, MODIFIED_TIME) is expected
+
+
+@pytest.mark.parametrize('if_modified_since, expected', (
+    (formatdate(MODIFIED_TIME, usegmt=True), True),
+    (formatdate(MODIFIED_TIME + 60, usegmt=True), True),
+    (formatdate(MODIFIED_TIME - 60, usegmt=True), False),
+    ('not a date', False),
+))
+def test_is_not_modified_by_date(if_modified_since, expected):
+    assert is_not_modified({'if-modified-since': if_modified_since}, ETAG, MODIFIED_TIME) is expected
+
+
+def test_if_none_match_wins_over_if_modified_since():
+    headers = {'if-none-match': make_etag('old'), 'if-modified-since': formatdate(MODIFIED_TIME, usegmt=True)}
+
+    assert is_not_modified(headers, ETAG, MODIFIED_TIME) is False
+
+
+@pytest.mark.parametrize('accept_encoding, expected', (
+    ('gzip', True),
+    ('gzip, deflate, br', True),
+    ('GZIP;q=0.5', True),
+    ('gzip;q=0', False),
+    ('gzip; q=0.0, *', False),
+    ('*', True),
+    ('*;q=0', False),
+    ('*;q=0, gzip', True),
+    ('gzip;q=bad', False),
+    ('deflate', False),
+    ('', False),
+))
+def test_accepts_encoding(accept_encoding, expected):
+    assert accepts_encoding({'accept-encoding': accept_encoding}, 'gzip') is expected
+
+
+def test_accepts_encoding_without_the_header():
+    assert accepts_encoding({}, 'gzip') is False
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from sqlalchemy import delete, func
+
+from db import User
+from db.engine import SessionManager
+from import_users import read_batches, import_users
+from test_db import is_database_available, close_pooled_connections
+
+USER = '"email": "user{0}@example.com", "password": "password", "username": "user{0}", ' \
+       '"first_name": "User", "second_name": "Test"'
+
+
+def read_users(path, file_format: str) -> tuple[list, dict]:
+    stats = {'inserted': 0, 'existing': 0, 'invalid': 0}
+    users = [user for batch in read_batches(str(path), file_format, 2, stats) for user in batch]
+    return users, stats
+
+
+def test_malformed_jsonl_lines_are_invalid(tmp_path):
+    path = tmp_path / 'users.jsonl'
+    path.write_text('\n'.join((
+        '{' + USER.format(1) + '}',
+        '{' + USER.format(2),
+        '[1, 2]',
+        '',
+        '{' + USER.format(3) + '}',
+    )), encoding='utf-8')
+
+    users, stats = read_users(path, 'jsonl')
+
+    assert [user.username for user in users] == ['user1', 'user3']
+    assert stats['invalid'] == 2
+
+
+def test_malformed_csv_rows_are_invalid(tmp_path):
+    path = tmp_path / 'users.csv'
+    path.write_text('\n'.join((
+        'email,password,username,first_name,second_name',
+        'user1@example.com,password,user1,User,Test',
+        'user2@example.com,password,user2,User',
+        'user3@example.com,password,user3,User,Test,extra',
+        'user4@example.com,password,user4,User,Test',
+    )), encoding='utf-8')
+
+    users, stats = read_users(path, 'csv')
+
+    assert [user.username for user in users] == ['user1', 'user4']
+    assert stats['invalid'] == 2
+
+
+@pytest.mark.skipif(not is_database_available(), reason='postgres is not available')
+def test_email_case_variants_are_existing(tmp_path):
+    path = tmp_path / 'users.jsonl'
+    path.write_text('\n'.join((
+        '{' + USER.format('case1') + '}',
+        '{' + USER.format('case2').replace('usercase2@', 'USERcase1@') + '}',
+        '{' + USER.format('case3').replace('usercase3@', 'UserCase1@') + '}',
+    )), encoding='utf-8')
+
+    async def import_and_clean() -> dict:
+        try:
+            return await import_users(str(path), 'jsonl', 10, 1)
+        finally:
+            async with SessionManager().get_session() as session:
+                await session.execute(delete(User).where(func.lower(User.email) == 'usercase1@example.com')
+                                      .execution_options(synchronize_session=False))
+                await session.commit()
+            await close_pooled_connections()
+
+    stats = asyncio.run(import_and_clean())
+
+    assert stats == {'inserted': 1, 'existing': 2, 'invalid': 0}
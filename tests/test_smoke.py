@@ -0,0 +1,72 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.dependencies.models import Dependant
+
+from routers.schemas import UserRead, UserUpdate
+
+
+def test_application_imports():
+    import main
+
+    application = main.create_application()
+    paths = {route.path for route in application.routes}
+
+    assert isinstance(application, FastAPI)
+    assert {'/code/batch', '/code/search', '/metrics/db', '/news/from_vk'} <= paths
+
+
+def get_dependency_calls(dependant: Dependant) -> set:
+    calls = {dependant.call}
+    for dependency in dependant.dependencies:
+        calls |= get_dependency_calls(dependency)
+    return calls
+
+
+def test_user_lookups_use_read_sessions():
+    import main
+    from controllers.user_controller import get_user_manager, get_read_user_manager
+
+    for route in main.create_application().routes:
+        if not route.path.startswith('/users/'):
+            continue
+
+        calls = get_dependency_calls(route.dependant)
+        if 'GET' in route.methods:
+            assert get_read_user_manager in calls and get_user_manager not in calls, route.path
+        else:
+            assert get_user_manager in calls, route.path
+
+
+def test_users_router_matches_read_routes_by_path_and_method(monkeypatch):
+    from controllers import user_controller
+
+    get_read_users_router = user_controller.fastapi_users_read.get_users_router
+
+    def get_reversed_users_router(*args):
+        router = get_read_users_router(*args)
+        router.routes.reverse()
+        return router
+
+    monkeypatch.setattr(user_controller.fastapi_users_read, 'get_users_router', get_reversed_users_router)
+    routes = user_controller.get_users_router(UserRead, UserUpdate).routes
+
+    for route in routes:
+        calls = get_dependency_calls(route.dependant)
+        assert (user_controller.get_read_user_manager in calls) == ('GET' in route.methods), route.path
+    assert [route.path for route in routes][:2] == ['/me', '/me']
+
+
+def test_users_router_requires_every_read_route(monkeypatch):
+    from controllers import user_controller
+
+    get_read_users_router = user_controller.fastapi_users_read.get_users_router
+
+    def get_users_router_without_me(*args):
+        router = get_read_users_router(*args)
+        router.routes = [route for route in router.routes if route.path != '/me']
+        return router
+
+    monkeypatch.setattr(user_controller.fastapi_users_read, 'get_users_router', get_users_router_without_me)
+
+    with pytest.raises(RuntimeError):
+        user_controller.get_users_router(UserRead, UserUpdate)
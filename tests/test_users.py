@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+from fastapi_users import exceptions
+
+from controllers.user_controller import UserManager
+from db import User
+
+
+def test_updated_user_is_cached_without_a_read():
+    # no user database, every lookup has to be a cache hit
+    user_manager = UserManager(None)
+
+    asyncio.run(user_manager.on_after_update(User(id=-1, email='user@example.com', is_active=False), {}))
+
+    assert asyncio.run(user_manager.get(-1)).is_active is False
+
+
+def test_deleted_user_is_not_found_without_a_read():
+    user_manager = UserManager(None)
+
+    asyncio.run(user_manager.on_after_delete(User(id=-2, email='user@example.com', is_active=True)))
+
+    with pytest.raises(exceptions.UserNotExists):
+        asyncio.run(user_manager.get(-2))
@@ -0,0 +1,97 @@
+import pytest
+
+from processes.vk_feed import VkFeed, VkNewsRecord, VkFeedError, VK_FEED_ADD, VK_FEED_EDIT, VK_FEED_DELETE, \
+    VK_FEED_RESET
+
+
+def make_record(post_id: int, title: str | None = None) -> VkNewsRecord:
+    return VkNewsRecord(post_id, title or f'post {post_id}', 'content', None, f'https://vk.com/wall-1_{post_id}')
+
+
+def post_ids(feed: VkFeed) -> list[int]:
+    return [record.post_id for record in feed]
+
+
+def test_ring_at_capacity_drops_the_oldest():
+    feed = VkFeed(capacity=3)
+    for post_id in range(1, 6):
+        feed.add(make_record(post_id))
+
+    assert post_ids(feed) == [5, 4, 3]
+    assert len(feed) == 3
+    assert 2 not in feed and 1 not in feed
+    assert feed.newest_post_id() == 5
+
+
+def test_add_of_a_known_post_edits_in_place():
+    feed = VkFeed(capacity=3)
+    for post_id in range(1, 4):
+        feed.add(make_record(post_id))
+
+    feed.add(make_record(2, 'edited'))
+
+    assert post_ids(feed) == [3, 2, 1]
+    assert feed.items()[1].title == 'edited'
+
+
+def test_delete_then_add_after_the_ring_wrapped():
+    feed = VkFeed(capacity=3)
+    for post_id in range(1, 6):
+        feed.add(make_record(post_id))
+
+    feed.delete(4)
+    assert post_ids(feed) == [5, 3]
+
+    feed.add(make_record(6))
+    feed.add(make_record(7))
+
+    assert post_ids(feed) == [7, 6, 5]
+    assert set(feed.slots) == {7, 6, 5}
+
+
+def test_delete_of_an_unknown_post_is_ignored():
+    feed = VkFeed(capacity=3)
+    feed.add(make_record(1))
+
+    feed.delete(2)
+
+    assert post_ids(feed) == [1]
+
+
+def test_diff_applied_to_a_copy_gives_the_same_feed():
+    old_records = [make_record(post_id) for post_id in (4, 3, 2, 1)]
+    new_records = [make_record(6), make_record(5), make_record(4, 'edited'), make_record(2), make_record(1)]
+
+    feed = VkFeed(capacity=5)
+    feed.reset(old_records)
+    replica = VkFeed(capacity=5)
+    replica.apply([(VK_FEED_RESET, old_records)], version=1)
+
+    deltas = feed.diff(new_records)
+    assert (VK_FEED_DELETE, 3) in deltas
+    assert (VK_FEED_EDIT, make_record(4, 'edited')) in deltas
+    assert [value.post_id for action, value in deltas if action == VK_FEED_ADD] == [5, 6]
+
+    feed.apply(deltas)
+    assert replica.apply(deltas, version=2) == 2
+    assert feed.items() == replica.items() == new_records
+
+
+def test_diff_of_the_same_records_is_empty():
+    records = [make_record(post_id) for post_id in (3, 2, 1)]
+    feed = VkFeed(capacity=3)
+    feed.reset(records)
+
+    assert feed.diff(records) == []
+
+
+def test_apply_bumps_the_version():
+    feed = VkFeed()
+    version = feed.version
+
+    assert feed.apply([]) == version + 1
+
+
+def test_unknown_action_is_an_error():
+    with pytest.raises(VkFeedError):
+        VkFeed().apply([('move', 1)])